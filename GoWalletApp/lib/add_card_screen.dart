@@ -2,6 +2,8 @@ import 'package:flutter/material.dart';
 import 'package:flutter/services.dart';
 import 'dart:convert';
 import 'package:http/http.dart' as http;
+import 'package:shared_preferences/shared_preferences.dart';
+import 'read_after.dart';
 
 class AddCardScreen extends StatefulWidget {
   final String userPhone;
@@ -50,11 +52,17 @@ class _AddCardScreenState extends State<AddCardScreen> {
       };
 
       try {
-        final response = await http.post(
+        final prefs = await SharedPreferences.getInstance();
+        final token = prefs.getString('auth_token') ?? '';
+
+        final response = rememberReadAfter(await http.post(
           Uri.parse('http://192.168.58.135:5000/add_card'),
-          headers: {"Content-Type": "application/json"},
+          headers: withReadAfter({
+            "Content-Type": "application/json",
+            "Authorization": "Bearer $token",
+          }),
           body: jsonEncode(cardData),
-        );
+        ));
 
         if (response.statusCode == 201) {
           // Return masked number to parent widget
@@ -68,6 +76,10 @@ class _AddCardScreenState extends State<AddCardScreen> {
           ScaffoldMessenger.of(context).showSnackBar(
             const SnackBar(content: Text('User not found')),
           );
+        } else if (response.statusCode == 401) {
+          ScaffoldMessenger.of(context).showSnackBar(
+            const SnackBar(content: Text('Session expired. Please login again.')),
+          );
         } else {
           ScaffoldMessenger.of(context).showSnackBar(
             const SnackBar(content: Text('Error adding card')),
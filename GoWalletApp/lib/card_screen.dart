@@ -3,6 +3,7 @@ import 'package:http/http.dart' as http;
 import 'dart:convert';
 import 'package:shared_preferences/shared_preferences.dart';
 import 'package:intl/intl.dart';
+import 'read_after.dart';
 
 class CardScreen extends StatefulWidget {
   final int cardId;
@@ -56,13 +57,13 @@ class _CardScreenState extends State<CardScreen> {
 
   Future<void> _fetchCardData() async {
     try {
-      final response = await http.get(
+      final response = rememberReadAfter(await http.get(
         Uri.parse('http://192.168.58.135:5000/get_card/${widget.cardId}'),
-        headers: {
+        headers: withReadAfter({
           'Content-Type': 'application/json',
           'Authorization': 'Bearer $_authToken',
-        },
-      );
+        }),
+      ));
 
       print('API response for card ${widget.cardId}: Status ${response.statusCode}, Body: ${response.body}');
 
@@ -94,13 +95,13 @@ class _CardScreenState extends State<CardScreen> {
     });
 
     try {
-      final response = await http.delete(
+      final response = rememberReadAfter(await http.delete(
         Uri.parse('http://192.168.87.209:5000/delete_card/${widget.cardId}'),
-        headers: {
+        headers: withReadAfter({
           'Content-Type': 'application/json',
           'Authorization': 'Bearer $_authToken',
-        },
-      );
+        }),
+      ));
 
       setState(() {
         _isDeleting = false;
@@ -1,7 +1,9 @@
 import 'package:flutter/material.dart';
 import 'package:http/http.dart' as http;
 import 'dart:convert';
+import 'dart:math';
 import 'package:shared_preferences/shared_preferences.dart';
+import 'read_after.dart';
 
 class CompanyScreen extends StatefulWidget {
   final String companyId;
@@ -32,6 +34,11 @@ class _CompanyScreenState extends State<CompanyScreen> {
   String? _authToken;
   TextEditingController _amountController = TextEditingController();
 
+  // Idempotency key of the payment being submitted. It is reused when the same
+  // payment is retried after a network error, so the server never charges twice.
+  String? _paymentKey;
+  String? _paymentKeyPayload;
+
   // Base URL for API requests - this should match your backend
   final String _baseUrl = 'http://192.168.58.135:5000'; // Ensure this matches your actual backend URL
 
@@ -83,10 +90,10 @@ class _CompanyScreenState extends State<CompanyScreen> {
 
     try {
       print("Fetching company details for ID: ${widget.companyId}");
-      final response = await http.get(
+      final response = rememberReadAfter(await http.get(
         Uri.parse('$_baseUrl/company/${widget.companyId}'),
-        headers: {'Content-Type': 'application/json'},
-      );
+        headers: withReadAfter({'Content-Type': 'application/json'}),
+      ));
 
       print("Company API response code: ${response.statusCode}");
       print("Company API response body: ${response.body}");
@@ -136,13 +143,13 @@ class _CompanyScreenState extends State<CompanyScreen> {
     try {
       // Add authorization header with token
       print("Fetching cards for user: $_userPhone");
-      final response = await http.get(
+      final response = rememberReadAfter(await http.get(
         Uri.parse('$_baseUrl/user_cards/$_userPhone'),
-        headers: {
+        headers: withReadAfter({
           'Content-Type': 'application/json',
           'Authorization': 'Bearer $_authToken',
-        },
-      );
+        }),
+      ));
 
       print("Cards API response code: ${response.statusCode}");
       if (response.statusCode == 200) {
@@ -271,6 +278,12 @@ class _CompanyScreenState extends State<CompanyScreen> {
     );
   }
 
+  String _generatePaymentKey() {
+    final random = Random.secure();
+    final bytes = List<int>.generate(16, (_) => random.nextInt(256));
+    return bytes.map((b) => b.toRadixString(16).padLeft(2, '0')).join();
+  }
+
   // Updated method for payment processing with improved error handling and debugging
   Future<void> _processPayment() async {
     // Check for selected card
@@ -327,14 +340,28 @@ class _CompanyScreenState extends State<CompanyScreen> {
 
       print("Data being sent: ${jsonEncode(payload)}");
 
-      final response = await http.post(
+      // New payment details get a new idempotency key, a retry keeps the old one
+      if (_paymentKey == null || _paymentKeyPayload != jsonEncode(payload)) {
+        _paymentKey = _generatePaymentKey();
+        _paymentKeyPayload = jsonEncode(payload);
+      }
+
+      final response = rememberReadAfter(await http.post(
         Uri.parse('$_baseUrl/make_payment'),
-        headers: {
+        headers: withReadAfter({
           'Content-Type': 'application/json',
           'Authorization': 'Bearer $_authToken',
-        },
+          'Idempotency-Key': _paymentKey!,
+        }),
         body: jsonEncode(payload),
-      );
+      ));
+
+      // The server has answered (409 means the first attempt is still running),
+      // so the next payment must not reuse this key
+      if (response.statusCode < 500 && response.statusCode != 409) {
+        _paymentKey = null;
+        _paymentKeyPayload = null;
+      }
 
       print("Response code: ${response.statusCode}");
       print("Response body: ${response.body}");
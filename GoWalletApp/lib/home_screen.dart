@@ -7,6 +7,7 @@ import 'login_screen.dart';
 import 'card_screen.dart';
 import 'package:mobile_scanner/mobile_scanner.dart';
 import 'company_screen.dart';
+import 'read_after.dart';
 
 class HomeScreen extends StatefulWidget {
   final String userPhone;
@@ -61,13 +62,13 @@ class _HomeScreenState extends State<HomeScreen> {
       print('Using token for API request: $token');
 
       // Execute API request to get user's card list
-      final response = await http.get(
+      final response = rememberReadAfter(await http.get(
         Uri.parse('http://192.168.58.135:5000/user_cards/${widget.userPhone}'),
-        headers: {
+        headers: withReadAfter({
           'Authorization': 'Bearer $token',
           'Content-Type': 'application/json',
-        },
-      );
+        }),
+      ));
 
       // Debug log
       print('API response status: ${response.statusCode}');
@@ -0,0 +1,20 @@
+import 'package:http/http.dart' as http;
+
+// The server's marker of this app's last write (a payment, a new card).
+// Sent back with every request, so the next reads see the write even when
+// they are answered from a read replica or by another server worker.
+const readAfterHeader = 'X-GoWallet-Read-After';
+String? _readAfter;
+
+Map<String, String> withReadAfter(Map<String, String> headers) {
+  final marker = _readAfter;
+  return marker == null ? headers : {...headers, readAfterHeader: marker};
+}
+
+http.Response rememberReadAfter(http.Response response) {
+  final marker = response.headers[readAfterHeader.toLowerCase()];
+  if (marker != null) {
+    _readAfter = marker;
+  }
+  return response;
+}
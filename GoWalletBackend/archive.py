@@ -0,0 +1,142 @@
+"""
+Monthly archives of cold transaction history.
+
+A closed month is written to a folder of its own (<folder>/YYYY-MM) as two
+gzip-compressed NDJSON files, one grouped by card and one by company. Every
+card's or company's rows, newest first, are stored as gzip members of at
+most ARCHIVE_CHUNK_ROWS rows, and a JSON index next to each file gives the
+byte ranges of its members. Reading one card's month therefore decompresses
+only that card's rows, one line at a time, while the concatenated members
+are still an ordinary gzip file: `zcat by_card_id.ndjson.gz` prints the
+whole month.
+
+Rows are dicts with id, card_id, company_id, amount (minor units) and
+timestamp (naive UTC datetime).
+"""
+import gzip
+import io
+import itertools
+import json
+import os
+import shutil
+from datetime import datetime
+
+from cache import LRUCache
+
+ARCHIVE_KEYS = ('card_id', 'company_id')
+ARCHIVE_INDEX_CACHE_SIZE = 64  # (month, key) indexes kept in memory
+ARCHIVE_CHUNK_ROWS = 10000     # rows per gzip member; reading a month oldest first holds one member's rows
+
+index_cache = LRUCache(ARCHIVE_INDEX_CACHE_SIZE)
+
+def month_folder(folder, month):
+    return os.path.join(folder, f"{month:%Y-%m}")
+
+def data_path(folder, month, key):
+    return os.path.join(month_folder(folder, month), f"by_{key}.ndjson.gz")
+
+def index_path(folder, month, key):
+    return os.path.join(month_folder(folder, month), f"by_{key}.index.json")
+
+def encode_row(row):
+    return json.dumps({
+        'id': row['id'],
+        'card_id': row['card_id'],
+        'company_id': row['company_id'],
+        'amount': row['amount'],
+        'timestamp': row['timestamp'].isoformat()
+    }, separators=(',', ':'))
+
+def decode_row(line):
+    row = json.loads(line)
+    row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+    return row
+
+def write_month(folder, month, rows_by):
+    """
+    Writes the archive of `month`. rows_by(key) returns the month's rows
+    ordered by that key and then newest first, e.g. from a server-side
+    cursor, so a month never has to fit in memory. Returns the row count.
+    """
+    target = month_folder(folder, month)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    counts = []
+    for key in ARCHIVE_KEYS:
+        index = {}
+        count = 0
+        with open(os.path.join(tmp, f"by_{key}.ndjson.gz"), 'wb') as f:
+            for value, rows in itertools.groupby(rows_by(key), key=lambda row: row[key]):
+                chunks = index[str(value)] = []
+                while lines := [encode_row(row) for row in itertools.islice(rows, ARCHIVE_CHUNK_ROWS)]:
+                    member = gzip.compress(('\n'.join(lines) + '\n').encode(), mtime=0)
+                    chunks.append([f.tell(), len(member)])
+                    f.write(member)
+                    count += len(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        with open(os.path.join(tmp, f"by_{key}.index.json"), 'w') as f:
+            json.dump(index, f, separators=(',', ':'))
+        counts.append(count)
+    if len(set(counts)) != 1:
+        raise RuntimeError(f"Archive of {month:%Y-%m} is inconsistent: {counts} rows per key")
+
+    # A leftover of an earlier, interrupted run is replaced
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+    for key in ARCHIVE_KEYS:
+        index_cache.pop((target, key))
+    return counts[0]
+
+def load_index(folder, month, key):
+    cache_key = (month_folder(folder, month), key)
+    index = index_cache.get(cache_key)
+    if index is None:
+        with open(index_path(folder, month, key)) as f:
+            index = json.load(f)
+        index_cache.set(cache_key, index)
+    return index
+
+class _Span(io.RawIOBase):
+    """`length` bytes of `f` from its current position, so gzip stops at the end of a card's members."""
+    def __init__(self, f, length):
+        self.f = f
+        self.remaining = length
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.f.read(min(len(buffer), self.remaining))
+        self.remaining -= len(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+def _read_lines(f, offset, length):
+    f.seek(offset)
+    with gzip.GzipFile(fileobj=io.BufferedReader(_Span(f, length))) as lines:
+        yield from lines
+
+def read_month(folder, month, key, value, oldest_first=False):
+    """
+    Yields the archived rows of one card or company (key 'card_id' or
+    'company_id') in `month`, newest first, decompressing as it goes. With
+    oldest_first, one member of at most ARCHIVE_CHUNK_ROWS rows is held at a
+    time to reverse it.
+    """
+    chunks = load_index(folder, month, key).get(str(value))
+    if not chunks:
+        return
+    with open(data_path(folder, month, key), 'rb') as f:
+        if oldest_first:
+            for offset, length in reversed(chunks):
+                for line in reversed(list(_read_lines(f, offset, length))):
+                    yield decode_row(line)
+        else:
+            # A card's members are written one after the other
+            start = chunks[0][0]
+            end = chunks[-1][0] + chunks[-1][1]
+            for line in _read_lines(f, start, end - start):
+                yield decode_row(line)
@@ -0,0 +1,10 @@
+"""
+ASGI entry point: the mobile payment endpoints run on asyncio with async
+database sessions (see async_api.py), everything else through the Flask app.
+
+    uvicorn --workers 4 asgi:app
+"""
+from app import create_app
+from async_api import AsyncMobileAPI
+
+app = AsyncMobileAPI(create_app())
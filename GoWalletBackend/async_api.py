@@ -0,0 +1,364 @@
+"""
+Async mobile API for the ASGI deployment mode (see asgi.py).
+
+Requests are routed with the Flask app's own URL map. The mobile JSON
+endpoints in ASYNC_VIEWS are served by coroutines on async SQLAlchemy
+sessions (asyncpg, or aiosqlite locally), so a request waiting on the
+database does not hold a worker thread. They run inside a Flask request
+context: `request`, `g`, jsonify and the app's JSON provider work as in the
+sync views, which share their validation and response helpers with these.
+Every other request, including the admin views, goes to the Flask app on
+asgiref's WSGI thread pool.
+"""
+import asyncio
+import io
+import sys
+from functools import wraps
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import g, jsonify, request
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError, OperationalError, DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from werkzeug.exceptions import HTTPException
+
+from app import (
+    Card, Company, IdempotencyKey, Transaction, PaymentError, logger,
+    PAYMENT_MAX_RETRIES, IDEMPOTENCY_WAIT_TIMEOUT, company_cache, idempotency_cache,
+    authenticate_request, principal_cache, idempotency_scope, cache_idempotent_record, replay_response,
+    remember_idempotent_response, parse_payment_request, payment_response, debit_statement,
+    daily_totals_upsert, payment_timestamp, is_retryable_db_error, retry_delay,
+    make_company_info, company_response, user_card_item, recent_history_select, card_details,
+    start_request_timer, record_request, invalidate_wallet,
+    rate_limiter, check_payment_limits, rate_limited_response, payment_events_insert, payment_feed,
+    replica_router, read_after, remember_replica_writer,
+)
+from ratelimit import RateLimited
+
+def build_environ(scope):
+    """WSGI environ of an ASGI HTTP request, without the body."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('ascii'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin1').upper().replace('-', '_')
+        key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f'HTTP_{name}'
+        value = value.decode('latin1')
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+class AsyncMobileAPI:
+    """ASGI application serving ASYNC_VIEWS on asyncio and everything else through Flask."""
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.engine = create_async_engine(flask_app.config['ASYNC_DATABASE_URL'],
+                                          **flask_app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.replica_engine = self.replica_sessions = None
+        if flask_app.config['ASYNC_DATABASE_REPLICA_URL']:
+            self.replica_engine = create_async_engine(flask_app.config['ASYNC_DATABASE_REPLICA_URL'],
+                                                      **flask_app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+            self.replica_sessions = async_sessionmaker(self.replica_engine, expire_on_commit=False)
+        self.inflight = {}  # Idempotency-Key -> Future of the stored response of the request in flight
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+
+        environ = build_environ(scope)
+        try:
+            endpoint, view_args = self.flask_app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            endpoint = None  # 404s, 405s and redirects are Flask's to answer
+        view = ASYNC_VIEWS.get(endpoint)
+        if view is None:
+            return await self.wsgi(scope, receive, send)
+
+        environ['wsgi.input'] = io.BytesIO(await read_body(receive))
+        with self.flask_app.request_context(environ):
+            start_request_timer()
+            try:
+                response = self.flask_app.make_response(await view(self, **view_args))
+            except Exception:
+                logger.exception("unhandled error", extra={'endpoint': endpoint})
+                response = self.flask_app.make_response((jsonify({'error': 'Internal server error'}), 500))
+            response = remember_replica_writer(record_request(response))  # Flask's after_request hooks do not run here
+            await send({
+                'type': 'http.response.start',
+                'status': response.status_code,
+                'headers': [(name.lower().encode('latin1'), value.encode('latin1'))
+                            for name, value in response.headers.items()],
+            })
+            await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else response.get_data()})
+
+    def read_session(self):
+        """A session on the replica in a view @read_replica routed there, otherwise on the primary."""
+        return self.replica_sessions() if g.get('read_replica') else self.sessions()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                if self.replica_engine is not None:
+                    await self.replica_engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+def token_required(f):
+    """Async counterpart of app.token_required."""
+    @wraps(f)
+    async def decorated_function(api, *args, **kwargs):
+        token = request.headers.get('Authorization', '')[len('Bearer '):]
+        if token in principal_cache:
+            current_user, error = authenticate_request()
+        else:
+            # Not verified lately: the revocation check queries the database, so keep it off the event loop
+            current_user, error = await asyncio.to_thread(authenticate_request)
+        if error:
+            return error
+        return await f(api, current_user=current_user, *args, **kwargs)
+    return decorated_function
+
+def read_replica(f):
+    """Async counterpart of app.read_replica: the view reads through api.read_session()."""
+    @wraps(f)
+    async def decorated_function(api, *args, **kwargs):
+        g.read_replica = api.replica_sessions is not None and replica_router.use_replica(read_after())
+        try:
+            return await f(api, *args, **kwargs)
+        except DBAPIError:
+            if not g.read_replica:
+                raise
+            replica_router.mark_down()
+            g.read_replica = False
+            return await f(api, *args, **kwargs)
+    return decorated_function
+
+async def get_company_by_account(session, account_number):
+    """Read-through lookup in the shared company cache."""
+    info = company_cache.get(account_number)
+    if info is None:
+        row = (await session.execute(
+            select(Company.id, Company.name, Company.logo, Company.account_number)
+            .where(Company.account_number == account_number, Company.deleted_at.is_(None))
+        )).first()
+        if row is not None:
+            info = make_company_info(row)
+            company_cache.set(account_number, info)
+    return info
+
+async def debit_card(session, card_id, company_id, amount, user_id, on_debit=None):
+    """app.debit_card on an AsyncSession: the same statements and retries, awaited."""
+    dialect_name = session.bind.dialect.name
+    for attempt in range(PAYMENT_MAX_RETRIES):
+        try:
+            new_balance = (await session.execute(debit_statement(card_id, user_id, amount))).scalar_one_or_none()
+
+            if new_balance is None:
+                # Nothing was updated: either the card does not exist or it has no funds
+                available_balance = (await session.execute(
+                    select(Card.balance).where(Card.id == card_id, Card.user_id == user_id, Card.deleted_at.is_(None))
+                )).scalar()
+                await session.rollback()
+                if available_balance is None:
+                    raise PaymentError("Card not found", 404)
+                raise PaymentError("Insufficient funds on card", 400, available_balance=available_balance)
+
+            transaction = Transaction(
+                card_id=card_id,
+                company_id=company_id,
+                amount=amount,
+                timestamp=payment_timestamp()
+            )
+            session.add(transaction)
+            await session.flush()
+            await session.execute(*payment_events_insert(
+                [(transaction.id, card_id, company_id, amount, transaction.timestamp)]))
+            await session.execute(*daily_totals_upsert(dialect_name, [(company_id, transaction.timestamp, amount)]))
+            if on_debit:
+                on_debit(transaction, new_balance)
+            await session.commit()
+            invalidate_wallet(user_id)
+            payment_feed.notify()
+            return transaction, new_balance
+
+        except OperationalError as e:
+            await session.rollback()
+            if not is_retryable_db_error(e) or attempt == PAYMENT_MAX_RETRIES - 1:
+                raise
+            await asyncio.sleep(retry_delay(attempt))
+
+@token_required
+async def make_payment(api, current_user):
+    """Async /make_payment, with the same Idempotency-Key semantics as the sync view."""
+    try:
+        scope = idempotency_scope()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if scope is None:
+        return await pay(api, current_user)
+    key, request_hash = scope
+
+    stored = idempotency_cache.get(key)
+    if stored is not None:
+        return replay_response(stored, request_hash)
+
+    inflight = api.inflight.get(key)
+    if inflight is not None:
+        # A duplicate of a request still in flight waits for its result
+        try:
+            stored = await asyncio.wait_for(asyncio.shield(inflight), IDEMPOTENCY_WAIT_TIMEOUT)
+        except asyncio.TimeoutError:
+            stored = None
+        if stored is None:
+            return jsonify({'error': 'A request with this Idempotency-Key is still being processed'}), 409
+        return replay_response(stored, request_hash)
+
+    inflight = api.inflight[key] = asyncio.get_running_loop().create_future()
+    stored = None
+    try:
+        async with api.sessions() as session:
+            stored = cache_idempotent_record(key, await session.get(IdempotencyKey, key))
+        if stored is not None:
+            return replay_response(stored, request_hash)
+
+        g.idempotency_key = key
+        g.idempotency_request_hash = request_hash
+        response = api.flask_app.make_response(await pay(api, current_user))
+        stored = (request_hash, response.status_code, response.get_data(as_text=True))
+        if response.status_code == 200:
+            idempotency_cache.set(key, stored)
+        response.headers['Idempotency-Key'] = request.headers['Idempotency-Key']
+        return response
+    finally:
+        del api.inflight[key]
+        inflight.set_result(stored)
+
+async def pay(api, current_user):
+    try:
+        card_id, account_number, amount = parse_payment_request(request.json)
+    except PaymentError as e:
+        logger.info("payment rejected", extra={'user_id': current_user.id, 'reason': e.message})
+        return e.to_response()
+    except ValueError:
+        logger.info("payment rejected", extra={'user_id': current_user.id, 'reason': "invalid amount or id"})
+        return jsonify({"error": "Invalid amount or ID format"}), 400
+    except Exception as e:
+        logger.exception("payment failed", extra={'user_id': current_user.id})
+        return jsonify({"error": f"Error processing payment: {str(e)}"}), 500
+
+    log_fields = {'user_id': current_user.id, 'card_id': card_id, 'account_number': account_number, 'amount': amount}
+    try:
+        reservation = check_payment_limits(current_user.id, card_id, amount)
+    except RateLimited as e:
+        logger.info("payment rejected", extra={**log_fields, 'reason': f"rate limit {e.name}"})
+        return rate_limited_response(e)
+
+    paid = False
+    try:
+        async with api.sessions() as session:
+            company = await get_company_by_account(session, account_number)
+            if not company:
+                logger.info("payment rejected", extra={**log_fields, 'reason': "company not found"})
+                return jsonify({"error": "Company with the specified account number not found"}), 404
+
+            try:
+                # Form response and store it for Idempotency-Key replays in the same commit
+                response = {}
+                def on_debit(transaction, new_balance):
+                    response.update(payment_response(transaction, new_balance, company))
+                    remember_idempotent_response(200, response, session=session)
+
+                transaction, new_balance = await debit_card(session, card_id, company.id, amount, current_user.id,
+                                                            on_debit=on_debit)
+                paid = True
+                g.db_wrote = True  # on the async session, which RoutingSession does not see
+
+                logger.info("payment completed", extra={**log_fields, 'company_id': company.id, 'transaction_id': transaction.id})
+                return jsonify(response), 200
+
+            except PaymentError as e:
+                logger.info("payment rejected", extra={**log_fields, 'reason': e.message, 'status': e.status_code})
+                return e.to_response()
+
+            except IntegrityError as e:
+                await session.rollback()
+                # Another worker committed a payment with the same Idempotency-Key first
+                key = g.get('idempotency_key')
+                stored = cache_idempotent_record(key, await session.get(IdempotencyKey, key)) if key else None
+                if stored is None:
+                    logger.exception("payment failed", extra={'user_id': current_user.id})
+                    return jsonify({"error": f"Error processing payment: {str(e)}"}), 500
+                logger.info("duplicate payment replayed", extra=log_fields)
+                return replay_response(stored, g.idempotency_request_hash)
+
+            except Exception as e:
+                await session.rollback()
+                logger.exception("payment failed", extra=log_fields)
+                return jsonify({"error": f"Error creating transaction: {str(e)}"}), 500
+    finally:
+        if not paid:
+            rate_limiter.release(reservation)
+
+@token_required
+@read_replica
+async def get_card(api, current_user, card_id):
+    async with api.read_session() as session:
+        card = (await session.scalars(
+            select(Card).where(Card.id == card_id, Card.user_id == current_user.id, Card.deleted_at.is_(None))
+        )).first()
+        if not card:
+            return jsonify({'error': 'Card not found'}), 404
+        recent_transactions = (await session.execute(recent_history_select(card_id))).all()
+    return jsonify(card_details(card, recent_transactions))
+
+@token_required
+@read_replica
+async def get_user_cards(api, phone, current_user):
+    if current_user.phone != phone:
+        return jsonify({'error': 'Unauthorized access'}), 403
+    async with api.read_session() as session:
+        cards = (await session.scalars(select(Card).where(Card.user_id == current_user.id, Card.deleted_at.is_(None)))).all()
+    return jsonify({'cards': [user_card_item(card) for card in cards]})
+
+@read_replica
+async def get_company(api, account_number):
+    async with api.read_session() as session:
+        company = await get_company_by_account(session, account_number)
+    return company_response(company)
+
+# Flask endpoint -> coroutine serving it in the ASGI mode
+ASYNC_VIEWS = {
+    'gowallet.make_payment': make_payment,
+    'gowallet.get_card': get_card,
+    'gowallet.get_user_cards': get_user_cards,
+    'gowallet.get_company': get_company,
+}
@@ -0,0 +1,58 @@
+"""
+Per-request cost of authenticating a mobile API call.
+
+Compares the old token_required (jwt.decode plus a User query on every
+request) with verify_token, which caches verified principals by token.
+
+Usage:
+    python benchmarks/bench_auth.py --requests 20000
+"""
+import argparse
+import time
+import warnings
+
+from common import count_statements
+from app import create_app, db, User, issue_token, verify_token, principal_cache
+
+app = create_app()
+
+import jwt
+
+def legacy_verify(token):
+    data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+    return User.query.filter_by(id=data['user_id']).first()
+
+def measure(fn, tokens, requests):
+    started = time.perf_counter()
+    for i in range(requests):
+        fn(tokens[i % len(tokens)])
+    return (time.perf_counter() - started) / requests * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=100)
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")  # short development SECRET_KEY
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        users = [User(name=f"User {i}", phone=f"+{i:012d}", password_hash="-") for i in range(args.users)]
+        db.session.add_all(users)
+        db.session.commit()
+        tokens = [issue_token(user) for user in users]
+
+        with count_statements(db.engine) as legacy_statements:
+            legacy = measure(legacy_verify, tokens, args.requests)
+        principal_cache.clear()
+        with count_statements(db.engine) as cached_statements:
+            cached = measure(verify_token, tokens, args.requests)
+
+    print(f"requests:                 {args.requests} over {args.users} tokens")
+    print(f"decode + User query:      {legacy:8.1f} us/request  ({legacy_statements.count} SQL statements)")
+    print(f"cached principal:         {cached:8.1f} us/request  ({cached_statements.count} SQL statements)")
+    print(f"speedup:                  {legacy / cached:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Compares /make_payments/batch with the same payments sent one by one to /make_payment.
+
+Usage:
+    python benchmarks/bench_batch.py --payments 500 --cards 20
+"""
+import argparse
+import random
+import sys
+import time
+
+from common import auth_headers, quiet
+from app import create_app, db, Card, Company, Transaction, User
+
+app = create_app()
+
+def seed(cards, companies, balance):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(name="Bench User", phone="+000000000000")
+        user.set_password("bench")
+        db.session.add(user)
+        db.session.flush()
+        db.session.add_all(
+            Company(name=f"Merchant {i}", account_number=f"BENCH{i:016d}", qr_code="")
+            for i in range(companies)
+        )
+        db.session.add_all(
+            Card(user_id=user.id, card_number=f"4000{i:012d}", balance=balance)
+            for i in range(cards)
+        )
+        db.session.commit()
+        card_ids = [card.id for card in Card.query.all()]
+        account_numbers = [company.account_number for company in Company.query.all()]
+        return card_ids, account_numbers, auth_headers(user)
+
+def total_balance():
+    with app.app_context():
+        return db.session.query(db.func.sum(Card.balance)).scalar()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payments", type=int, default=500)
+    parser.add_argument("--cards", type=int, default=20)
+    parser.add_argument("--companies", type=int, default=5)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    rng = random.Random(42)
+    timings = {}
+
+    for mode in ("single", "batch"):
+        card_ids, account_numbers, headers = seed(args.cards, args.companies, balance=1_000_000.0)
+        payments = [
+            {"card_id": rng.choice(card_ids), "company_id": rng.choice(account_numbers), "amount": 1.0}
+            for _ in range(args.payments)
+        ]
+        before = total_balance()
+
+        started = time.perf_counter()
+        with quiet():
+            if mode == "single":
+                ok = all(client.post("/make_payment", json=payment, headers=headers).status_code == 200
+                         for payment in payments)
+            else:
+                response = client.post("/make_payments/batch", json={"payments": payments}, headers=headers)
+                ok = response.status_code == 200 and response.json["succeeded"] == args.payments
+        timings[mode] = time.perf_counter() - started
+
+        with app.app_context():
+            recorded = Transaction.query.count()
+        debited = before - total_balance()
+        if not ok or recorded != args.payments or debited != args.payments:
+            print(f"FAIL: {mode} mode recorded {recorded} transactions and debited {debited}")
+            sys.exit(1)
+
+    print(f"database:            {app.config['SQLALCHEMY_DATABASE_URI']}")
+    print(f"payments:            {args.payments} over {args.cards} cards and {args.companies} companies")
+    for mode, elapsed in timings.items():
+        print(f"{mode + ':':<20} {elapsed * 1000:9.1f} ms  ({args.payments / elapsed:9.1f} payments/s)")
+    print(f"speedup:             {timings['single'] / timings['batch']:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Statement budget and latency check for the company transaction history page.
+
+Seeds a merchant with many transactions from many cards and users, then
+renders pages of /company/<id>/transactions. Exits with an error if a
+page issues more SQL statements than --max-statements, so an N+1 query
+creeping back into the view is caught.
+
+Usage:
+    python benchmarks/bench_company_transactions.py --transactions 50000
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from common import count_statements, percentile
+from app import create_app, db, Card, Company, Transaction, User, encode_cursor
+
+app = create_app()
+
+def seed(transactions, cards):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        company = Company(name="Bench Merchant", account_number="BENCH0000000000000001", qr_code="")
+        db.session.add(company)
+        users = [User(name=f"User {i}", phone=f"+{i:012d}", password_hash="-") for i in range(cards)]
+        db.session.add_all(users)
+        db.session.flush()
+        card_rows = [Card(user_id=user.id, card_number=f"4000{i:012d}", balance=0) for i, user in enumerate(users)]
+        db.session.add_all(card_rows)
+        db.session.flush()
+
+        rng = random.Random(42)
+        start = datetime(2025, 1, 1)
+        db.session.execute(Transaction.__table__.insert(), [{
+            "card_id": rng.choice(card_rows).id,
+            "company_id": company.id,
+            "amount": rng.randint(1, 100000) / 100,
+            "timestamp": start + timedelta(seconds=i * 30),
+        } for i in range(transactions)])
+        db.session.commit()
+        company_id = company.id
+    app.test_cli_runner().invoke(args=["rebuild-daily-totals"])
+    return company_id
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transactions", type=int, default=20000)
+    parser.add_argument("--cards", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--max-statements", type=int, default=3,
+                        help="company lookup + aggregate totals + page rows")
+    args = parser.parse_args()
+
+    company_id = seed(args.transactions, args.cards)
+    client = app.test_client()
+
+    # Start pages at random positions of the history, as if the admin had paged there
+    with app.app_context():
+        engine = db.engine
+        positions = db.session.query(Transaction.timestamp, Transaction.id) \
+            .order_by(db.func.random()).limit(args.requests).all()
+    cursors = [None] + [encode_cursor(timestamp, transaction_id) for timestamp, transaction_id in positions]
+
+    latencies = []
+    worst = 0
+    for cursor in cursors:
+        url = f"/company/{company_id}/transactions" + (f"?after={cursor}" if cursor else "")
+        with count_statements(engine) as counter:
+            started = time.perf_counter()
+            response = client.get(url)
+            latencies.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            print(f"FAIL: {url} returned {response.status_code}")
+            sys.exit(1)
+        worst = max(worst, counter.count)
+
+    print(f"transactions:        {args.transactions} from {args.cards} cards")
+    print(f"latency p50/p99:     {percentile(latencies, 0.5) * 1000:.2f} / {percentile(latencies, 0.99) * 1000:.2f} ms")
+    print(f"statements per page: {worst} (budget {args.max_statements})")
+    if worst > args.max_statements:
+        print("FAIL: the page issues more SQL statements than the budget")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Peak memory of the streaming transaction export.
+
+Seeds one company with --rows transactions, one per minute, then runs the
+CSV and NDJSON exports in fresh processes: once for the first day only and
+once for the whole history. Peak RSS must not grow by more than
+--max-growth-mb between the two, i.e. memory does not depend on export size.
+
+Usage:
+    python benchmarks/bench_export.py --rows 1000000
+
+Runs against a throwaway SQLite file unless DATABASE_URL is set.
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+from common import quiet
+from app import create_app, db, Card, Company, Transaction, User
+from sqlalchemy import insert
+
+app = create_app()
+
+START = datetime(2024, 1, 1)
+SEED_BATCH = 50000
+
+def seed(rows):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(name="Export Bench", phone="+000000000003")
+        user.set_password("bench")
+        company = Company(name="Export Merchant", account_number="EXPORT000000000000001", qr_code="")
+        db.session.add_all([user, company])
+        db.session.flush()
+        card = Card(user_id=user.id, card_number="4000000000000003", balance=0)
+        db.session.add(card)
+        db.session.flush()
+        for offset in range(0, rows, SEED_BATCH):
+            db.session.execute(insert(Transaction), [
+                {'card_id': card.id, 'company_id': company.id, 'amount': 1000 + i % 997,
+                 'timestamp': START + timedelta(minutes=i)}
+                for i in range(offset, min(offset + SEED_BATCH, rows))
+            ])
+        db.session.commit()
+        return company.id
+
+def export(company_id, fmt, query):
+    """Runs one export in this process. Returns (bytes, seconds, peak RSS in MB)."""
+    client = app.test_client()
+    started = time.perf_counter()
+    size = 0
+    with quiet():
+        response = client.get(f"/company/{company_id}/transactions.{fmt}{query}", buffered=False)
+        for chunk in response.response:
+            size += len(chunk)
+        response.close()
+    elapsed = time.perf_counter() - started
+    # ru_maxrss is in kilobytes on Linux
+    return size, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def measure(company_id, fmt, query):
+    child = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", str(company_id), fmt, query],
+        capture_output=True, text=True, check=True
+    )
+    size, elapsed, peak = child.stdout.split()
+    return int(size), float(elapsed), float(peak)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--max-growth-mb", type=float, default=20.0)
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        company_id, fmt, query = args.child
+        print(*export(int(company_id), fmt, query))
+        return
+
+    company_id = seed(args.rows)
+    first_day = START.date().isoformat()
+    print(f"transactions: {args.rows}")
+    print(f"{'format':>7} {'export':>10} {'rows':>9} {'MB':>9} {'seconds':>8} {'peak RSS MB':>12}")
+
+    failed = False
+    for fmt in ("csv", "ndjson"):
+        peaks = []
+        for label, query, rows in (("first day", f"?from={first_day}&to={first_day}", min(args.rows, 1440)),
+                                   ("full", "", args.rows)):
+            size, elapsed, peak = measure(company_id, fmt, query)
+            peaks.append(peak)
+            print(f"{fmt:>7} {label:>10} {rows:>9} {size / 2 ** 20:>9.1f} {elapsed:>8.2f} {peak:>12.1f}")
+        growth = peaks[1] - peaks[0]
+        if growth > args.max_growth_mb:
+            print(f"FAIL: {fmt} peak RSS grew by {growth:.1f} MB with the export size")
+            failed = True
+
+    if failed:
+        sys.exit(1)
+    print(f"OK: peak RSS independent of export size (within {args.max_growth_mb:.0f} MB)")
+
+if __name__ == "__main__":
+    main()
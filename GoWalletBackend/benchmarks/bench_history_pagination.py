@@ -0,0 +1,88 @@
+"""
+OFFSET versus keyset pagination over a large transaction history.
+
+Seeds one merchant and one card with many transactions, then times fetching
+a page at increasing depths with LIMIT/OFFSET and with the (timestamp, id)
+cursors used by /company/<id>/transactions and /card/<id>/transactions.
+Keyset latency should stay flat while OFFSET grows with the depth.
+
+Usage:
+    python benchmarks/bench_history_pagination.py --transactions 200000
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from common import percentile
+from app import create_app, db, Card, Company, Transaction, User, keyset_page, decode_cursor, encode_cursor
+
+app = create_app()
+
+PAGE_SIZE = 20
+
+def seed(transactions):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        company = Company(name="Bench Merchant", account_number="BENCH0000000000000001", qr_code="")
+        user = User(name="Bench User", phone="+000000000000", password_hash="-")
+        db.session.add_all([company, user])
+        db.session.flush()
+        card = Card(user_id=user.id, card_number="4000000000000000", balance=0)
+        db.session.add(card)
+        db.session.flush()
+        start = datetime(2020, 1, 1)
+        chunk = 50000
+        for offset in range(0, transactions, chunk):
+            db.session.execute(Transaction.__table__.insert(), [{
+                "card_id": card.id,
+                "company_id": company.id,
+                "amount": 1.0,
+                "timestamp": start + timedelta(seconds=i * 60),
+            } for i in range(offset, min(offset + chunk, transactions))])
+        db.session.commit()
+        return company.id
+
+def timed(fn, repeat=5):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return percentile(samples, 0.5) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transactions", type=int, default=200000)
+    args = parser.parse_args()
+
+    company_id = seed(args.transactions)
+    depths = [d for d in (1, 10, 100, 1000, 5000) if d * PAGE_SIZE < args.transactions]
+
+    print(f"database:     {app.config['SQLALCHEMY_DATABASE_URI']}")
+    print(f"transactions: {args.transactions}, page size {PAGE_SIZE}")
+    print(f"{'page':>8} {'OFFSET ms':>12} {'keyset ms':>12}")
+
+    with app.app_context():
+        query = Transaction.query.filter(Transaction.company_id == company_id)
+        for depth in depths:
+            offset = (depth - 1) * PAGE_SIZE
+
+            def offset_page():
+                query.order_by(Transaction.timestamp.desc(), Transaction.id.desc()) \
+                    .limit(PAGE_SIZE).offset(offset).all()
+
+            # The cursor a client would hold after reading the previous page
+            cursor = None
+            if offset:
+                last = query.order_by(Transaction.timestamp.desc(), Transaction.id.desc()) \
+                    .offset(offset - 1).first()
+                cursor = decode_cursor(encode_cursor(last.timestamp, last.id))
+
+            def cursor_page():
+                keyset_page(query, after=cursor, limit=PAGE_SIZE)
+
+            print(f"{depth:>8} {timed(offset_page):>12.2f} {timed(cursor_page):>12.2f}")
+
+if __name__ == "__main__":
+    main()
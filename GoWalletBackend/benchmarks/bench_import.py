@@ -0,0 +1,102 @@
+"""
+Bulk user and card provisioning against one call per user and card.
+
+Writes --rows users with one card each as CSV or NDJSON and imports them
+with the import-users code path, then provisions --baseline-rows more the
+old way, with a /register_user and an /add_card request each, and
+extrapolates. Fails unless every imported row produced its user and card.
+
+Password hashing dominates both paths at production cost (scrypt takes
+about 0.15 s per hash and core), so the benchmark hashes with a cheap
+--hash-method by default to measure everything else; the import spreads
+real hashing over all cores, the per-call path over the hashing pool.
+
+Usage:
+    python benchmarks/bench_import.py --rows 100000 --format csv
+
+Runs against a throwaway SQLite file unless DATABASE_URL is set.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+
+from common import quiet, auth_headers
+from app import create_app, db, import_users, password_hasher, Card, User
+
+app = create_app()
+
+FIELDS = ['name', 'phone', 'password', 'card_number', 'expiry_month', 'expiry_year', 'cardholder_name']
+
+def make_row(i):
+    return {'name': f"Partner User {i}", 'phone': f"+7{i:011d}", 'password': f"secret-{i}",
+            'card_number': f"8600{i:012d}", 'expiry_month': f"{i % 12 + 1:02d}", 'expiry_year': "29",
+            'cardholder_name': f"PARTNER USER {i}"}
+
+def write_file(path, fmt, rows):
+    with open(path, 'w', newline='') as f:
+        if fmt == 'csv':
+            writer = csv.DictWriter(f, FIELDS)
+            writer.writeheader()
+            writer.writerows(make_row(i) for i in range(rows))
+        else:
+            f.writelines(json.dumps(make_row(i)) + "\n" for i in range(rows))
+
+def per_call(first, rows):
+    """Provisions rows one /register_user and one /add_card request at a time."""
+    client = app.test_client()
+    for i in range(first, first + rows):
+        row = make_row(i)
+        response = client.post('/register_user', json={key: row[key] for key in ('name', 'phone', 'password')})
+        with app.app_context():
+            headers = auth_headers(db.session.get(User, response.json['user_id']))
+        client.post('/add_card', json={key: row[key] for key in ('card_number', 'expiry_month', 'expiry_year',
+                                                                 'cardholder_name')}, headers=headers)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--baseline-rows", type=int, default=1000)
+    parser.add_argument("--format", choices=("csv", "ndjson"), default="csv")
+    parser.add_argument("--workers", type=int, default=None, help="hashing processes (default: one per CPU core)")
+    parser.add_argument("--hash-method", default="pbkdf2:sha256:1",
+                        help="password hash method; use scrypt:32768:8:1 for production cost")
+    args = parser.parse_args()
+
+    password_hasher.configure(args.hash_method, password_hasher.workers, password_hasher.queue)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+    path = os.path.join(tempfile.mkdtemp(), f"users.{args.format}")
+    write_file(path, args.format, args.rows)
+    print(f"rows: {args.rows} users with one card each, {args.format}, hash method {args.hash_method}")
+
+    with quiet(), app.app_context(), open(path, encoding='utf-8-sig', newline='') as lines:
+        started = time.perf_counter()
+        result = import_users(lines, args.format, workers=args.workers)
+        bulk = time.perf_counter() - started
+        users, cards = User.query.count(), Card.query.count()
+
+    started = time.perf_counter()
+    with quiet():
+        per_call(args.rows, args.baseline_rows)
+    baseline = (time.perf_counter() - started) / args.baseline_rows
+
+    print(f"bulk import:  {bulk:8.1f} s  ({args.rows / bulk:8.0f} rows/s)")
+    print(f"per call:     {baseline * args.rows:8.1f} s  ({1 / baseline:8.0f} rows/s, "
+          f"extrapolated from {args.baseline_rows} rows)")
+    print(f"speedup:      {baseline * args.rows / bulk:8.1f}x")
+
+    if result['errors'] or result['users_created'] != args.rows or result['cards_created'] != args.rows \
+            or users != args.rows or cards != args.rows:
+        print(f"FAIL: {result['users_created']} users, {result['cards_created']} cards, "
+              f"{len(result['errors'])} errors (first: {result['errors'][:1]})")
+        sys.exit(1)
+    print("OK: every row imported")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Login throughput next to payment latency.
+
+Starts gunicorn on wsgi:app and runs --login-clients clients that log in
+over and over alongside --payment-clients clients that make payments.
+Reports logins/sec, logins turned away with 503 and payment latency for:
+no logins at all (the baseline), password hashing inline on the request
+threads (PASSWORD_HASH_WORKERS=0) and on the bounded hashing pool
+(PASSWORD_HASH_WORKERS=--hash-workers).
+
+Usage:
+    python benchmarks/bench_login.py --login-clients 32 --payment-clients 8
+
+Runs against a throwaway SQLite file unless DATABASE_URL is set.
+"""
+import argparse
+import http.client
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+
+from common import percentile
+from bench_load import seed, free_port, start_server, ACCOUNT_NUMBER
+
+LOGIN = json.dumps({"phone": "+000000000001", "password": "load"})  # the user seeded by bench_load
+
+def client_loop(port, request, stop, latencies, statuses):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            connection.request(*request())
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            status = 0
+        latencies.append(time.perf_counter() - started)
+        statuses.append(status)
+
+def run(port, card_ids, headers, login_clients, payment_clients, duration):
+    json_headers = {"Content-Type": "application/json"}
+    payment_headers = dict(headers, **json_headers)
+    def login():
+        return "POST", "/login_user", LOGIN, json_headers
+    def payment():
+        body = json.dumps({"card_id": card_ids[0], "company_id": ACCOUNT_NUMBER, "amount": 1})
+        return "POST", "/make_payment", body, payment_headers
+
+    stop = threading.Event()
+    logins, payments = ([], []), ([], [])
+    threads = [threading.Thread(target=client_loop, args=(port, login, stop, *logins)) for _ in range(login_clients)]
+    threads += [threading.Thread(target=client_loop, args=(port, payment, stop, *payments)) for _ in range(payment_clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return logins, payments
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker")
+    parser.add_argument("--hash-workers", type=int, default=1, help="hashing processes per gunicorn worker")
+    parser.add_argument("--login-clients", type=int, default=32)
+    parser.add_argument("--payment-clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per run")
+    args = parser.parse_args()
+
+    if shutil.which("gunicorn") is None:
+        sys.exit("gunicorn is not installed (pip install -r requirements.txt)")
+
+    card_ids, headers = seed(1)
+    print(f"{args.workers} workers x {args.threads} threads, {args.login_clients} login clients, "
+          f"{args.payment_clients} payment clients, {args.duration:.0f}s per run")
+    print(f"{'hashing':>8} {'logins/s':>9} {'503s':>6} {'payments/s':>11} {'pay p50 ms':>11} {'pay p99 ms':>11}")
+
+    for label, login_clients, hash_workers in (("none", 0, 0), ("inline", args.login_clients, 0),
+                                               ("pool", args.login_clients, args.hash_workers)):
+        os.environ["PASSWORD_HASH_WORKERS"] = str(hash_workers)
+        port = free_port()
+        server = start_server(port, args.workers, args.threads + 2, args.threads)
+        try:
+            (_, login_statuses), (payment_latencies, _) = run(port, card_ids, headers, login_clients,
+                                                              args.payment_clients, args.duration)
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{label:>8} {login_statuses.count(200) / args.duration:>9.1f} {login_statuses.count(503):>6} "
+              f"{len(payment_latencies) / args.duration:>11.1f} "
+              f"{percentile(payment_latencies, 0.5) * 1000:>11.2f} {percentile(payment_latencies, 0.99) * 1000:>11.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Money drift check.
+
+Debits a card a million times with random amounts through the batch payment
+engine and checks, against an integer oracle, that the card balance, the
+SQL sum of the transactions and the daily rollup are exact to the tiyin.
+The same amounts accumulated in binary floating point are shown for
+comparison. tests/test_money.py runs the same check on fewer debits, along
+with the Money conversions.
+
+Usage:
+    python benchmarks/bench_money.py --debits 1000000 --batch 1000
+
+Runs against a throwaway SQLite file unless DATABASE_URL is set.
+"""
+import argparse
+import random
+import sys
+import time
+from decimal import Decimal
+
+from common import quiet
+from app import create_app, db, debit_cards_batch, Card, Company, CompanyDailyTotal, Transaction, User
+from money import from_minor, MINOR_UNITS
+
+app = create_app()
+
+def seed(balance):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(name="Money Bench", phone="+000000000002")
+        user.set_password("bench")
+        company = Company(name="Money Merchant", account_number="MONEY0000000000000001", qr_code="")
+        db.session.add_all([user, company])
+        db.session.flush()
+        card = Card(user_id=user.id, card_number="4000000000000002", balance=balance)
+        db.session.add(card)
+        db.session.commit()
+        return user.id, company.id, card.id
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--debits", type=int, default=1000000)
+    parser.add_argument("--batch", type=int, default=1000, help="debits per debit_cards_batch call")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    # Amounts between 0.01 and 999.99, the oracle works in integer tiyin
+    amounts_minor = [rng.randrange(1, 100000) for _ in range(args.debits)]
+    spent_minor = sum(amounts_minor)
+    initial = from_minor(spent_minor + rng.randrange(0, 10 ** 6))
+    user_id, company_id, card_id = seed(initial)
+
+    started = time.perf_counter()
+    with quiet(), app.app_context():
+        for offset in range(0, args.debits, args.batch):
+            payments = [{'card_id': card_id, 'company_id': company_id, 'amount': from_minor(minor)}
+                        for minor in amounts_minor[offset:offset + args.batch]]
+            results = debit_cards_batch(payments, user_id)
+            if any(not isinstance(result, tuple) for result in results):
+                print(f"FAIL: a debit was rejected in the batch at {offset}")
+                sys.exit(1)
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        balance = db.session.get(Card, card_id).balance
+        transaction_sum = db.session.query(db.func.sum(Transaction.amount)).scalar()
+        rollup_sum = db.session.query(db.func.sum(CompanyDailyTotal.total_amount)).scalar()
+
+    expected = initial - from_minor(spent_minor)
+    float_balance = float(initial)
+    for minor in amounts_minor:
+        float_balance -= minor / MINOR_UNITS
+
+    print(f"debits:            {args.debits} in batches of {args.batch} ({args.debits / elapsed:.0f} debits/s)")
+    print(f"balance:           {initial} -> {balance} (expected {expected})")
+    print(f"transactions sum:  {transaction_sum} (expected {from_minor(spent_minor)})")
+    print(f"daily rollup sum:  {rollup_sum}")
+    print(f"float64 balance:   {float_balance!r} (drift {Decimal(float_balance) - expected:.2E})")
+
+    if balance != expected or transaction_sum != from_minor(spent_minor) or rollup_sum != transaction_sum:
+        print("FAIL: money drifted")
+        sys.exit(1)
+    print("OK: no drift")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Stress benchmark for the payment engine.
+
+Fires thousands of concurrent payments at the same card through /make_payment
+and checks that the final balance matches the committed transactions exactly.
+
+Usage:
+    python benchmarks/bench_payments.py --payments 2000 --threads 16
+    python benchmarks/bench_payments.py --legacy   # old read-modify-write path, for comparison
+
+Runs against a throwaway SQLite file unless DATABASE_URL is set.
+"""
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from common import auth_headers, quiet, percentile
+from app import create_app, db, Card, Company, Transaction, User
+
+app = create_app()
+
+ACCOUNT_NUMBER = "BENCH0000000000000001"
+
+def seed(balance):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(name="Bench User", phone="+000000000000")
+        user.set_password("bench")
+        company = Company(name="Bench Merchant", account_number=ACCOUNT_NUMBER, qr_code="")
+        db.session.add_all([user, company])
+        db.session.flush()
+        card = Card(user_id=user.id, card_number="4000000000000000", balance=balance)
+        db.session.add(card)
+        db.session.commit()
+        return card.id, auth_headers(user)
+
+def pay_via_endpoint(card_id, amount, headers):
+    client = app.test_client()
+    response = client.post(
+        "/make_payment",
+        json={"card_id": card_id, "company_id": ACCOUNT_NUMBER, "amount": amount},
+        headers=headers,
+    )
+    return response.status_code == 200
+
+def pay_legacy(card_id, amount, headers):
+    # The pre-engine implementation: read the balance, subtract in Python, commit
+    with app.app_context():
+        try:
+            card = db.session.get(Card, card_id)
+            if card.balance < amount:
+                return False
+            company = Company.query.filter_by(account_number=ACCOUNT_NUMBER).first()
+            card.balance -= amount
+            db.session.add(Transaction(card_id=card_id, company_id=company.id, amount=amount))
+            db.session.commit()
+            return True
+        except Exception:
+            db.session.rollback()
+            return False
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payments", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--amount", type=Decimal, default=Decimal("1.00"))
+    parser.add_argument("--legacy", action="store_true", help="use the old read-modify-write payment path")
+    args = parser.parse_args()
+
+    # Fund the card for exactly half of the payments so the engine has to refuse the rest
+    initial_balance = args.amount * (args.payments // 2)
+    card_id, headers = seed(initial_balance)
+    pay = pay_legacy if args.legacy else pay_via_endpoint
+
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(_):
+        started = time.perf_counter()
+        ok = pay(card_id, args.amount, headers)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+        return ok
+
+    started = time.perf_counter()
+    with quiet(), ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(worker, range(args.payments)))
+    elapsed = time.perf_counter() - started
+
+    succeeded = sum(results)
+    with app.app_context():
+        final_balance = db.session.get(Card, card_id).balance
+        recorded = Transaction.query.filter_by(card_id=card_id).count()
+
+    expected_balance = initial_balance - succeeded * args.amount
+    drift = final_balance - expected_balance
+
+    print(f"mode:              {'legacy read-modify-write' if args.legacy else 'payment engine'}")
+    print(f"database:          {app.config['SQLALCHEMY_DATABASE_URI']}")
+    print(f"payments:          {args.payments} on {args.threads} threads")
+    print(f"throughput:        {args.payments / elapsed:.1f} payments/s")
+    print(f"latency p50/p99:   {percentile(latencies, 0.5) * 1000:.2f} / {percentile(latencies, 0.99) * 1000:.2f} ms")
+    print(f"succeeded:         {succeeded} (transactions recorded: {recorded})")
+    print(f"balance:           {initial_balance} -> {final_balance} (expected {expected_balance})")
+    print(f"balance drift:     {drift}")
+
+    if drift != 0 or recorded != succeeded or final_balance < 0:
+        print("FAIL: balance does not match the committed transactions")
+        sys.exit(1)
+    print("OK: no balance drift")
+
+if __name__ == "__main__":
+    main()
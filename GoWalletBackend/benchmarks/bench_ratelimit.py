@@ -0,0 +1,133 @@
+"""
+Cost and correctness of the in-memory rate limits.
+
+Times the limiter work of one payment (the user, card and IP buckets plus
+the card velocity rules, as in check_payment_limits) single-threaded and
+from several threads, and checks that the limits hold exactly: a card
+gets its burst and no more, also when threads race for it, and a released
+reservation gives the amount back.
+
+Usage:
+    python benchmarks/bench_ratelimit.py --checks 200000 --threads 8
+    python benchmarks/bench_ratelimit.py --redis redis://localhost:6379/15
+
+Fails when the p99 of a check exceeds --max-p99 microseconds.
+"""
+import argparse
+import sys
+import threading
+import time
+
+from common import percentile
+from app import (PAYMENT_USER_LIMIT, PAYMENT_CARD_LIMIT, PAYMENT_IP_LIMIT, CARD_VELOCITY_RULES)
+from ratelimit import RateLimiter, RateLimited, MemoryBackend, RedisBackend, Limit, Velocity
+
+def payment_check(limiter, user_id, card_id, ip, amount):
+    # check_payment_limits without the request context
+    card_key = f"{user_id}:{card_id}"
+    limiter.hit((PAYMENT_USER_LIMIT, user_id), (PAYMENT_CARD_LIMIT, card_key), (PAYMENT_IP_LIMIT, ip))
+    return limiter.record(CARD_VELOCITY_RULES, card_key, amount)
+
+def run(limiter, checks, users, offset=0):
+    """Times `checks` payment checks spread over `users` users; returns the durations in microseconds."""
+    durations = []
+    for i in range(offset, offset + checks):
+        user_id = i % users
+        started = time.perf_counter()
+        payment_check(limiter, user_id, user_id, f"10.{user_id % 250}.{user_id // 250 % 250}.1", 1000)
+        durations.append((time.perf_counter() - started) * 1e6)
+    return durations
+
+def check_limits(limiter, threads):
+    """Returns an error message, or None if the limits hold."""
+    limiter.backend.clear()
+    bucket = Limit('bench-bucket', rate=1e-9, burst=50)
+    passed = []
+
+    def race():
+        for _ in range(100):
+            try:
+                limiter.hit((bucket, 'shared'))
+                passed.append(1)
+            except RateLimited:
+                pass
+
+    workers = [threading.Thread(target=race) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    if len(passed) != bucket.burst:
+        return f"{len(passed)} of {threads * 100} racing requests passed a bucket of {bucket.burst}"
+
+    rules = (Velocity('bench-count', 60, 4, None), Velocity('bench-amount', 3600, 100, 1000))
+    reservations = [limiter.record(rules, 'card', 300) for _ in range(3)]
+    try:
+        limiter.record(rules, 'card', 200)
+        return "a payment over the amount cap was accepted"
+    except RateLimited as e:
+        if e.name != 'bench-amount' or e.retry_after <= 0:
+            return f"the amount cap was reported as {e.name!r}, retry after {e.retry_after}"
+    limiter.release(reservations.pop())
+    try:
+        limiter.record(rules, 'card', 300)
+    except RateLimited:
+        return "a released reservation was still counted"
+    try:
+        limiter.record(rules, 'card', 100)
+        limiter.record(rules, 'card', 1)
+        return "a payment over the count cap was accepted"
+    except RateLimited as e:
+        if e.name != 'bench-count':
+            return f"the count cap was reported as {e.name!r}"
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--checks", type=int, default=200000)
+    parser.add_argument("--users", type=int, default=20000, help="distinct users and cards the checks rotate over")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--redis", help="also run against this Redis URL (needs the redis package)")
+    parser.add_argument("--max-p99", type=float, default=100.0, help="microseconds, memory backend")
+    args = parser.parse_args()
+
+    backends = [("memory", MemoryBackend(), time.monotonic)]
+    if args.redis:
+        backends.append(("redis", RedisBackend(args.redis), time.time))
+
+    failed = False
+    for name, backend, clock in backends:
+        limiter = RateLimiter(backend)
+        limiter.clock = clock
+        error = check_limits(limiter, args.threads)
+        if error:
+            print(f"{name:<7} FAIL: {error}")
+            failed = True
+            continue
+
+        backend.clear()
+        single = run(limiter, args.checks, args.users)
+        backend.clear()
+        durations = []
+        per_thread = args.checks // args.threads
+        workers = [threading.Thread(target=lambda n=n: durations.extend(
+            run(limiter, per_thread, args.users, n * per_thread))) for n in range(args.threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        print(f"{name:<7} 1 thread:   p50 {percentile(single, 0.5):6.1f} us  p99 {percentile(single, 0.99):6.1f} us")
+        print(f"{name:<7} {args.threads} threads:  p50 {percentile(durations, 0.5):6.1f} us  "
+              f"p99 {percentile(durations, 0.99):6.1f} us  {len(durations) / elapsed:,.0f} checks/s")
+        if name == "memory" and percentile(single, 0.99) > args.max_p99:
+            print(f"FAIL: p99 of a check is over {args.max_p99} us")
+            failed = True
+    if failed:
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Read replica routing on two SQLite files.
+
+The replica is a copy of the primary file, refreshed every --replicate
+seconds. Users pay and read their cards in a random mix, each sending back
+the read-after marker of their last payment like the app does, while every
+request may be answered by any worker. Fails if a user ever reads a balance
+other than the one their last payment left, or if a broken replica fails
+requests instead of sending them to the primary. Prints the share of
+SELECTs the replica served.
+
+Usage:
+    python benchmarks/bench_replica.py --users 200 --requests 5000 --write-share 0.2
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+folder = tempfile.mkdtemp()
+PRIMARY, REPLICA = os.path.join(folder, "primary.db"), os.path.join(folder, "replica.db")
+os.environ["DATABASE_URL"] = "sqlite:///" + PRIMARY
+os.environ["DATABASE_REPLICA_URL"] = "sqlite:///" + REPLICA
+
+from common import auth_headers, count_statements, quiet
+import app as gowallet
+from app import create_app, db, Card, Company, User
+
+app = create_app()
+
+def replicate():
+    source, target = sqlite3.connect(PRIMARY), sqlite3.connect(REPLICA)
+    source.backup(target)
+    source.close()
+    target.close()
+
+def seed(users):
+    with app.app_context():
+        db.create_all()
+        people = [User(name=f"Replica Bench {i}", phone=f"+1{i:011d}") for i in range(users)]
+        for person in people:
+            person.set_password("bench")
+        db.session.add_all(people)
+        db.session.add(Company(name="Replica Merchant", account_number="REPL0000000000000001", qr_code=""))
+        db.session.flush()
+        cards = [Card(user_id=person.id, card_number=f"5{i:015d}", balance=1_000_000) for i, person in enumerate(people)]
+        db.session.add_all(cards)
+        db.session.commit()
+        return [(auth_headers(person), card.id) for person, card in zip(people, cards)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--write-share", type=float, default=0.2, help="share of requests that are payments")
+    parser.add_argument("--replicate", type=float, default=0.5, help="seconds between copies to the replica")
+    args = parser.parse_args()
+
+    gowallet.replica_router.interval = args.replicate / 5
+    clients = seed(args.users)
+    markers = {}  # card_id -> read-after header of its user's last payment
+    balances = {card_id: 1_000_000 for _, card_id in clients}
+    replicate()
+
+    stop = threading.Event()
+    def replication():
+        while not stop.wait(args.replicate):
+            replicate()
+    threading.Thread(target=replication, daemon=True).start()
+
+    client = app.test_client(use_cookies=False)  # like the app, which sends the marker as a header
+    deadline = time.monotonic() + 10
+    while not gowallet.replica_router.healthy and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    rng = random.Random(0)
+    stale = failed_requests = reads = 0
+    with app.app_context():
+        primary, replica = db.engines[None], db.engines['replica']
+    started = time.perf_counter()
+    with quiet(), count_statements(primary) as on_primary, count_statements(replica) as on_replica:
+        for _ in range(args.requests):
+            headers, card_id = rng.choice(clients)
+            if rng.random() < args.write_share:
+                response = client.post("/make_payment", headers={**headers, **markers.get(card_id, {})},
+                                       json={"card_id": card_id, "company_id": "REPL0000000000000001", "amount": "1"})
+                if response.status_code == 200:
+                    balances[card_id] -= 1
+                    markers[card_id] = {gowallet.READ_AFTER_HEADER: response.headers[gowallet.READ_AFTER_HEADER]}
+                else:
+                    failed_requests += 1
+                continue
+            response = client.get(f"/get_card/{card_id}", headers={**headers, **markers.get(card_id, {})})
+            reads += 1
+            if response.status_code != 200:
+                failed_requests += 1
+            elif response.json["balance"] != balances[card_id]:
+                stale += 1
+    elapsed = time.perf_counter() - started
+    stop.set()
+
+    # The replica breaks between two measurements: reads must fall back to the primary
+    with app.app_context():
+        db.engines['replica'].dispose()
+    with open(REPLICA, "wb") as broken:
+        broken.write(b"not a database" * 100)
+    with quiet():
+        fallback = [client.get(f"/get_card/{card_id}", headers=headers) for headers, card_id in clients[:20]]
+    fallback_failed = sum(1 for response in fallback if response.status_code != 200
+                          or response.json["balance"] != balances[response.json["id"]])
+
+    total = on_primary.count + on_replica.count
+    print(f"requests:            {args.requests} in {elapsed:.2f}s, {args.write_share:.0%} payments, "
+          f"{failed_requests} failed")
+    print(f"statements:          {on_replica.count} of {total} on the replica ({on_replica.count / max(total, 1):.0%}), "
+          f"heartbeats included")
+    print(f"card reads:          {reads}, {stale} showed a balance older than the user's last payment")
+    print(f"replica broken:      {len(fallback) - fallback_failed} of {len(fallback)} reads answered by the primary")
+    failed = False
+    if stale:
+        print(f"FAIL: {stale} reads missed the user's own payment")
+        failed = True
+    if failed_requests or fallback_failed:
+        print(f"FAIL: {failed_requests + fallback_failed} requests failed")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Statement budget, caching and invalidation of the /wallet summary.
+
+Seeds a user with --cards cards and --transactions transactions each, then
+compares the home screen loaded the old way (/user_cards, then /get_card for
+every card) with one /wallet call. Exits with an error if a cold /wallet
+issues more SQL statements than --max-statements, if a cached one issues
+any, if it disagrees with /get_card, or if a payment or a deleted card is
+not reflected in the next /wallet response. tests/test_wallet.py checks the
+same on a smaller wallet, along with the card history pages.
+
+Usage:
+    python benchmarks/bench_wallet.py --cards 10 --transactions 1000
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from common import count_statements, auth_headers, quiet
+from app import create_app, db, Card, Company, Transaction, User
+
+app = create_app()
+
+PHONE = "+000000000004"
+
+def seed(cards, transactions):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(name="Wallet User", phone=PHONE, password_hash="-")
+        companies = [Company(name=f"Shop {i}", account_number=f"WALLET{i:015d}", qr_code="") for i in range(1, 6)]
+        db.session.add_all([user, *companies])
+        db.session.flush()
+        card_rows = [Card(user_id=user.id, card_number=f"4000{i:012d}", balance=10 ** 6) for i in range(cards)]
+        new_card = Card(user_id=user.id, card_number="4999999999999999", balance=0)  # no history yet
+        db.session.add_all([*card_rows, new_card])
+        db.session.flush()
+        rng = random.Random(7)
+        start = datetime(2025, 1, 1)
+        db.session.execute(Transaction.__table__.insert(), [{
+            "card_id": card.id,
+            "company_id": rng.choice(companies).id,
+            "amount": rng.randint(1, 100000),
+            "timestamp": start + timedelta(minutes=i),
+        } for card in card_rows for i in range(transactions)])
+        db.session.commit()
+        return [card.id for card in card_rows] + [new_card.id], companies[0].account_number, auth_headers(user)
+
+def timed(engine, load):
+    with count_statements(engine) as counter:
+        started = time.perf_counter()
+        result = load()
+        elapsed = time.perf_counter() - started
+    return result, counter.count, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=10)
+    parser.add_argument("--transactions", type=int, default=1000, help="per card")
+    parser.add_argument("--max-statements", type=int, default=2, help="cards + recent transactions of all cards")
+    args = parser.parse_args()
+
+    card_ids, account_number, headers = seed(args.cards, args.transactions)
+    client = app.test_client()
+    with app.app_context():
+        engine = db.engine
+
+    def per_card():
+        cards = client.get(f"/user_cards/{PHONE}", headers=headers).json['cards']
+        return [client.get(f"/get_card/{card['id']}", headers=headers).json for card in cards]
+
+    def summary():
+        response = client.get("/wallet", headers=headers)
+        if response.status_code != 200:
+            print(f"FAIL: /wallet returned {response.status_code}")
+            sys.exit(1)
+        return response.json['cards']
+
+    def fail(message):
+        print(f"FAIL: {message}")
+        sys.exit(1)
+
+    legacy, legacy_statements, legacy_time = timed(engine, per_card)
+    cold, cold_statements, cold_time = timed(engine, summary)
+    warm, warm_statements, warm_time = timed(engine, summary)
+    print(f"cards:               {args.cards} with {args.transactions} transactions each, one without")
+    print(f"user_cards+get_card: {legacy_statements:3d} statements {legacy_time * 1000:8.2f} ms")
+    print(f"wallet (cold):       {cold_statements:3d} statements {cold_time * 1000:8.2f} ms")
+    print(f"wallet (cached):     {warm_statements:3d} statements {warm_time * 1000:8.2f} ms")
+
+    if cold_statements > args.max_statements:
+        fail(f"/wallet issued {cold_statements} statements, budget {args.max_statements}")
+    if warm_statements:
+        fail("a cached /wallet still queried the database")
+    if cold != legacy or warm != cold:
+        fail("/wallet does not match /get_card")
+
+    # Changes made through the API must show up in the next summary
+    with quiet():
+        paid = client.post("/make_payment", json={"card_id": card_ids[0], "company_id": account_number, "amount": "12.34"}, headers=headers)
+    if paid.status_code != 200:
+        fail(f"payment returned {paid.status_code}: {paid.json}")
+    after_payment = summary()
+    if after_payment[0]['balance'] != paid.json['new_balance'] or \
+            after_payment[0]['recent_transactions'][0]['id'] != paid.json['transaction_id']:
+        fail("the payment is missing from the next /wallet")
+    client.delete(f"/delete_card/{card_ids[-1]}", headers=headers)
+    if [card['id'] for card in summary()] != card_ids[:-1]:
+        fail("the deleted card is still in the next /wallet")
+    print("OK")
+
+if __name__ == "__main__":
+    main()
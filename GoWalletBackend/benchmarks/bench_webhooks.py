@@ -0,0 +1,141 @@
+"""
+Delivery of payment events to merchant webhooks.
+
+Makes payments to several merchants whose webhook URLs point at a local
+HTTP stand-in that refuses a share of the requests, then runs the
+dispatcher until the outbox is drained. Fails unless every event arrived
+at least once with a valid signature. Prints the requests the batching
+saved and the events delivered per second. tests/test_outbox.py checks the
+batching and the retries without a network.
+
+Usage:
+    python benchmarks/bench_webhooks.py --payments 20000 --companies 20 --failure-rate 0.2
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from common import quiet
+import outbox
+from app import create_app, db, debit_cards_batch, dispatch_payment_events, Card, Company, PaymentEvent, User
+from outbox import SIGNATURE_HEADER, WEBHOOK_WORKERS, new_webhook_secret
+
+app = create_app()
+
+class Merchants(BaseHTTPRequestHandler):
+    """Webhook endpoint of every merchant: /<company_id>, refusing `failure_rate` of the requests."""
+    secrets = {}
+    failure_rate = 0.0
+    received = []  # (company_id, event ids)
+    bad_signatures = 0
+    requests = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        company_id = int(self.path.strip('/'))
+        with Merchants.lock:
+            Merchants.requests += 1
+            fail = random.random() < Merchants.failure_rate
+        if fail:
+            self.send_response(503)
+            self.end_headers()
+            return
+        expected = 'sha256=' + hmac.new(Merchants.secrets[company_id].encode(), body, hashlib.sha256).hexdigest()
+        with Merchants.lock:
+            if not hmac.compare_digest(self.headers.get(SIGNATURE_HEADER, ''), expected):
+                Merchants.bad_signatures += 1
+            Merchants.received.append((company_id, [event['id'] for event in json.loads(body)['events']]))
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+def seed(payments, companies, base_url):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(name="Webhook Bench", phone="+000000000003")
+        user.set_password("bench")
+        db.session.add(user)
+        db.session.flush()
+        merchants = [Company(name=f"Merchant {i}", account_number=f"HOOK{i:016d}", qr_code="",
+                             webhook_secret=new_webhook_secret()) for i in range(companies)]
+        db.session.add_all(merchants)
+        card = Card(user_id=user.id, card_number="4000000000000003", balance=payments)
+        db.session.add(card)
+        db.session.flush()
+        for merchant in merchants:
+            merchant.webhook_url = f"{base_url}/{merchant.id}"
+            Merchants.secrets[merchant.id] = merchant.webhook_secret
+        db.session.commit()
+        rng = random.Random(0)
+        company_ids = [merchant.id for merchant in merchants]
+        for start in range(0, payments, 1000):
+            debit_cards_batch([{'card_id': card.id, 'company_id': rng.choice(company_ids), 'amount': 1}
+                               for _ in range(min(1000, payments - start))], user.id)
+        return dict(db.session.query(PaymentEvent.id, PaymentEvent.company_id).all())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payments", type=int, default=20000)
+    parser.add_argument("--companies", type=int, default=20)
+    parser.add_argument("--failure-rate", type=float, default=0.2, help="share of webhook requests refused")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to drain the outbox")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Merchants)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    Merchants.failure_rate = args.failure_rate
+    outbox.WEBHOOK_RETRY_BACKOFF = 0.01  # retries in milliseconds instead of seconds
+    events = seed(args.payments, args.companies, f"http://127.0.0.1:{server.server_port}")
+
+    started = time.perf_counter()
+    # Every refused request is logged as a warning
+    with quiet(logging.ERROR), app.app_context(), ThreadPoolExecutor(max_workers=WEBHOOK_WORKERS) as executor:
+        while time.perf_counter() - started < args.timeout:
+            if not dispatch_payment_events(executor):
+                pending = PaymentEvent.query.filter(PaymentEvent.delivered_at.is_(None)).count()
+                db.session.rollback()
+                if not pending:
+                    break
+                time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    delivered = {}
+    for company_id, event_ids in Merchants.received:
+        for event_id in event_ids:
+            delivered[event_id] = delivered.get(event_id, 0) + 1
+    missing = [event_id for event_id in events if event_id not in delivered]
+    misrouted = sum(1 for company_id, event_ids in Merchants.received
+                    for event_id in event_ids if events.get(event_id) != company_id)
+    duplicates = sum(count - 1 for count in delivered.values())
+
+    print(f"events:              {len(events)} to {args.companies} merchants")
+    print(f"webhook requests:    {Merchants.requests} ({args.failure_rate:.0%} refused), "
+          f"{len(events) / max(len(Merchants.received), 1):.1f} events per accepted request")
+    print(f"delivered:           {len(delivered)} in {elapsed:.2f}s ({len(delivered) / elapsed:,.0f} events/s), "
+          f"{duplicates} duplicates")
+    failed = False
+    if missing:
+        print(f"FAIL: {len(missing)} events were never delivered")
+        failed = True
+    if misrouted or Merchants.bad_signatures:
+        print(f"FAIL: {misrouted} events went to the wrong merchant, {Merchants.bad_signatures} bad signatures")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
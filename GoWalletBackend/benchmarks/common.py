@@ -0,0 +1,63 @@
+"""
+Shared setup for the benchmark scripts.
+
+Importing this module points the app at a throwaway SQLite file (unless
+DATABASE_URL is already set), turns the rate limits off and makes `app`
+importable from here.
+"""
+import contextlib
+import logging
+import os
+import sys
+import tempfile
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+# The benchmarks drive a handful of users and cards far past the rate limits (see bench_ratelimit.py)
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@contextlib.contextmanager
+def quiet(level=logging.WARNING):
+    """Raises the app logger to `level` while measuring, so per-request lines stay out of the numbers."""
+    logger = logging.getLogger("gowallet")
+    previous = logger.level
+    logger.setLevel(level)
+    try:
+        yield
+    finally:
+        logger.setLevel(previous)
+
+def auth_headers(user):
+    """Authorization header with a freshly issued token for `user`."""
+    from app import issue_token
+    return {"Authorization": "Bearer " + issue_token(user)}
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+class count_statements:
+    """
+    Counts the SQL statements executed on `engine` inside the with block.
+
+        with count_statements(db.engine) as counter:
+            client.get("/home")
+        assert counter.count <= 3
+    """
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        from sqlalchemy import event
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
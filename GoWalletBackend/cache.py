@@ -0,0 +1,69 @@
+import threading
+import time
+from collections import OrderedDict
+
+class LRUCache:
+    """
+    Small thread-safe LRU cache used for in-process lookups.
+    Once `maxsize` entries are stored, the least recently used one is evicted.
+    With `ttl` (seconds) entries also expire; set() can override it per entry.
+    With `weigh`, `maxsize` bounds the total weight of the values instead of
+    their number, e.g. weigh=len to bound the bytes held.
+    """
+    def __init__(self, maxsize=1024, ttl=None, weigh=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.weigh = weigh or (lambda value: 1)
+        self.weight = 0
+        self._data = OrderedDict()  # key -> (value, expires_at or None)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        weight = self.weigh(value)
+        with self._lock:
+            self._remove(key)
+            if weight > self.maxsize:
+                return  # would evict everything else and still not fit
+            self._data[key] = (value, expires_at)
+            self.weight += weight
+            while self.weight > self.maxsize:
+                self._remove(next(iter(self._data)))
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._remove(key)
+            return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.weight = 0
+
+    def _remove(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.weight -= self.weigh(entry[0])
+        return entry
+
+    def __contains__(self, key):
+        return self.get(key, _missing) is not _missing
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+_missing = object()
@@ -0,0 +1,21 @@
+"""
+Gunicorn settings, overridable from the environment.
+
+Each worker process opens its own pool of up to DB_POOL_SIZE + DB_MAX_OVERFLOW
+connections; with threads, keep DB_POOL_SIZE at least GUNICORN_THREADS so
+requests do not queue for a connection.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+worker_class = "gthread"
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+keepalive = 5
+max_requests = 10000  # recycle workers now and then to bound memory growth
+max_requests_jitter = 1000
+# The app is imported in every worker: connection pools and the QR render
+# threads must not be created before the fork
+preload_app = False
@@ -0,0 +1,185 @@
+"""
+Company logo uploads.
+
+An upload is stored under the hash of its bytes, so two merchants uploading
+"logo.png" no longer overwrite each other and a stored file never changes:
+it can be served with an immutable Cache-Control. The request thread only
+checks the image header and writes the upload aside; re-encoding it within
+LOGO_MAX_SIZE pixels and rendering the thumbnails runs on a small
+background pool, the same way QR codes are rendered.
+
+Files, all in LOGO_FOLDER:
+    <digest>.upload         the upload as received, removed once processed
+    <digest>.<ext>          the logo re-encoded within LOGO_MAX_SIZE
+    <digest>_<size>.<ext>   one thumbnail per LOGO_SIZES entry
+"""
+import hashlib
+import io
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+LOGO_FOLDER = "static/uploads"
+LOGO_RENDER_WORKERS = 2  # background threads processing uploads
+LOGO_MAX_BYTES = 10 * 1024 * 1024  # larger uploads are refused
+LOGO_MAX_SIZE = 1024  # pixels, longest side of the stored logo
+LOGO_SIZES = (64, 160, 512)  # thumbnails, longest side in pixels
+LOGO_API_SIZE = 160  # returned by the JSON APIs: the app shows logos at 50 points, 3x on dense screens
+LOGO_JPEG_QUALITY = 85
+LOGO_RENDER_VERSION = 1  # bump when the processing changes, it is part of the digest
+
+# Hashed names, the only files served from LOGO_FOLDER; logos from before processing are moved by flask process-logos
+HASHED_NAME = re.compile(r'^([0-9a-f]{32})(?:_(\d+))?\.(png|jpg)$')
+
+_executor = ThreadPoolExecutor(max_workers=LOGO_RENDER_WORKERS, thread_name_prefix="logo-render")
+_pending = {}  # digest -> Future of a render in progress
+_pending_lock = threading.Lock()
+
+class InvalidLogo(ValueError):
+    """The upload is not an image we can process."""
+
+def logo_digest(data):
+    return hashlib.sha256(f"{LOGO_RENDER_VERSION}|".encode() + data).hexdigest()[:32]
+
+def logo_extension(image):
+    """Logos with transparency stay PNG, everything else becomes JPEG."""
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    return 'png' if has_alpha else 'jpg'
+
+def logo_path(digest, ext, size=None):
+    name = f"{digest}.{ext}" if size is None else f"{digest}_{size}.{ext}"
+    return os.path.join(LOGO_FOLDER, name)
+
+def store_logo(data):
+    """
+    Stores uploaded logo bytes and schedules their processing. Returns the
+    path of the processed logo, which is what Company.logo keeps; raises
+    InvalidLogo for anything that is not an image.
+    """
+    if len(data) > LOGO_MAX_BYTES:
+        raise InvalidLogo(f"Logos must be at most {LOGO_MAX_BYTES // (1024 * 1024)} MB")
+    try:
+        # Only the header is read here, decoding happens in the background
+        image = Image.open(io.BytesIO(data))
+        ext = logo_extension(image)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise InvalidLogo("The logo is not a readable image")
+
+    digest = logo_digest(data)
+    path = logo_path(digest, ext)
+    if not os.path.exists(path):
+        os.makedirs(LOGO_FOLDER, exist_ok=True)
+        upload_path = os.path.join(LOGO_FOLDER, f"{digest}.upload")
+        write_atomic(upload_path, data)
+        render_logo_async(digest, ext)
+    return path
+
+def write_atomic(path, data):
+    # Through a temporary file so readers never see a half-written one
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def encode(image, ext):
+    buffer = io.BytesIO()
+    if ext == 'png':
+        image.save(buffer, format='PNG', optimize=True)
+    else:
+        image.save(buffer, format='JPEG', quality=LOGO_JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+def render_logo(digest, ext):
+    """
+    Re-encodes a stored upload within LOGO_MAX_SIZE and renders its
+    thumbnails. Once the upload is gone, missing thumbnails (e.g. of a size
+    added to LOGO_SIZES) are rendered from the processed logo. Returns the logo path.
+    """
+    path = logo_path(digest, ext)
+    upload_path = os.path.join(LOGO_FOLDER, f"{digest}.upload")
+    try:
+        source = Image.open(upload_path)
+        from_upload = True
+    except FileNotFoundError:
+        # Processed earlier, possibly by another worker just now
+        source = Image.open(path)
+        from_upload = False
+    with source:
+        image = ImageOps.exif_transpose(source)  # first frame of animations
+        image = image.convert('RGBA' if ext == 'png' else 'RGB')
+
+    # Thumbnails first: the logo itself is what marks the upload as processed
+    for size in LOGO_SIZES:
+        thumbnail_path = logo_path(digest, ext, size)
+        if from_upload or not os.path.exists(thumbnail_path):
+            thumbnail = image.copy()
+            thumbnail.thumbnail((size, size), Image.LANCZOS)
+            write_atomic(thumbnail_path, encode(thumbnail, ext))
+    if from_upload:
+        image.thumbnail((LOGO_MAX_SIZE, LOGO_MAX_SIZE), Image.LANCZOS)
+        write_atomic(path, encode(image, ext))
+        try:
+            os.remove(upload_path)
+        except FileNotFoundError:
+            pass
+    return path
+
+def render_logo_async(digest, ext):
+    """Schedules processing on the background pool. Returns a Future with the logo path."""
+    with _pending_lock:
+        future = _pending.get(digest)
+        is_new = future is None
+        if is_new:
+            future = _pending[digest] = _executor.submit(render_logo, digest, ext)
+    if is_new:
+        future.add_done_callback(lambda _: _forget(digest))
+    return future
+
+def _forget(digest):
+    with _pending_lock:
+        _pending.pop(digest, None)
+
+def ensure_logo(filename):
+    """
+    Makes sure a hashed logo file exists, waiting for or doing the processing
+    of its upload if needed (e.g. when another worker received it).
+    Returns False for names that are not a known logo; raises InvalidLogo
+    if the upload cannot be processed.
+    """
+    match = HASHED_NAME.match(filename)
+    if not match:
+        return False
+    if os.path.exists(os.path.join(LOGO_FOLDER, filename)):
+        return True
+    digest, size, ext = match.groups()
+    if size is not None and int(size) not in LOGO_SIZES:
+        return False
+    if not os.path.exists(os.path.join(LOGO_FOLDER, f"{digest}.upload")) \
+            and not os.path.exists(logo_path(digest, ext)):
+        return False
+    try:
+        render_logo_async(digest, ext).result()
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        # e.g. a truncated upload whose header looked fine
+        raise InvalidLogo(f"The logo could not be processed: {e}") from e
+    return os.path.exists(os.path.join(LOGO_FOLDER, filename))
+
+def logo_variant(logo, size=LOGO_API_SIZE):
+    """
+    Path of the thumbnail of `logo` for `size` pixels: the smallest one at
+    least that large. Logos uploaded before processing existed are returned as is.
+    """
+    if not logo:
+        return logo
+    folder, filename = os.path.split(logo)
+    match = HASHED_NAME.match(filename)
+    if not match or match.group(2) is not None:
+        return logo
+    digest, _, ext = match.groups()
+    fitting = [s for s in LOGO_SIZES if s >= size]
+    if not fitting:
+        return logo
+    return f"{folder}/{digest}_{fitting[0]}.{ext}"
@@ -0,0 +1,55 @@
+"""Add company directory indexes
+
+Revision ID: 0379d7680eeb
+Revises: 7b5d78f2b532
+Create Date: 2026-10-18 10:11:38.807290
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0379d7680eeb'
+down_revision = '7b5d78f2b532'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = {
+    'ix_company_name_id': ['name', 'id'],
+}
+
+# Search indexes, only on PostgreSQL
+POSTGRESQL_INDEXES = [
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_company_name_trgm '
+    'ON company USING gin (name gin_trgm_ops)',
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_company_account_number_pattern '
+    'ON company (account_number varchar_pattern_ops)',
+]
+
+
+def upgrade():
+    if op.get_context().dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        # Build the indexes without locking the company table against admin edits
+        with op.get_context().autocommit_block():
+            for name, columns in INDEXES.items():
+                op.create_index(name, 'company', columns, unique=False,
+                                postgresql_concurrently=True, if_not_exists=True)
+            for statement in POSTGRESQL_INDEXES:
+                op.execute(statement)
+        return
+
+    with op.batch_alter_table('company', schema=None) as batch_op:
+        for name, columns in INDEXES.items():
+            batch_op.create_index(name, columns, unique=False)
+
+
+def downgrade():
+    if op.get_context().dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_company_account_number_pattern')
+        op.execute('DROP INDEX IF EXISTS ix_company_name_trgm')
+
+    with op.batch_alter_table('company', schema=None) as batch_op:
+        for name in INDEXES:
+            batch_op.drop_index(name)
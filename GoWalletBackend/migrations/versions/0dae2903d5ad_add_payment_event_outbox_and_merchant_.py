@@ -0,0 +1,55 @@
+"""Add payment event outbox and merchant webhooks
+
+Revision ID: 0dae2903d5ad
+Revises: f9c4d421901e
+Create Date: 2026-10-18 10:50:54.525412
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0dae2903d5ad'
+down_revision = 'f9c4d421901e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('payment_event',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('company_id', sa.Integer(), nullable=False),
+    sa.Column('card_id', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.BigInteger(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('delivered_at', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.String(length=255), nullable=True),
+    sa.ForeignKeyConstraint(['card_id'], ['card.id'], ondelete='RESTRICT'),
+    sa.ForeignKeyConstraint(['company_id'], ['company.id'], ondelete='RESTRICT'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # Payments made before the outbox existed get no events
+    with op.batch_alter_table('payment_event', schema=None) as batch_op:
+        batch_op.create_index('ix_payment_event_company_id_id', ['company_id', 'id'], unique=False)
+        batch_op.create_index('ix_payment_event_created_at', ['created_at'], unique=False)
+        batch_op.create_index('ix_payment_event_next_attempt_at', ['next_attempt_at'], unique=False, postgresql_where=sa.text('next_attempt_at IS NOT NULL'), sqlite_where=sa.text('next_attempt_at IS NOT NULL'))
+
+    with op.batch_alter_table('company', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('webhook_url', sa.String(length=500), nullable=True))
+        batch_op.add_column(sa.Column('webhook_secret', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('company', schema=None) as batch_op:
+        batch_op.drop_column('webhook_secret')
+        batch_op.drop_column('webhook_url')
+
+    with op.batch_alter_table('payment_event', schema=None) as batch_op:
+        batch_op.drop_index('ix_payment_event_next_attempt_at', postgresql_where=sa.text('next_attempt_at IS NOT NULL'), sqlite_where=sa.text('next_attempt_at IS NOT NULL'))
+        batch_op.drop_index('ix_payment_event_created_at')
+        batch_op.drop_index('ix_payment_event_company_id_id')
+
+    op.drop_table('payment_event')
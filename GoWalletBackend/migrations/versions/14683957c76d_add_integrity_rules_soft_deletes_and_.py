@@ -0,0 +1,102 @@
+"""Add integrity rules, soft deletes and lookup indexes
+
+Revision ID: 14683957c76d
+Revises: 0379d7680eeb
+Create Date: 2026-10-18 10:30:33.541727
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '14683957c76d'
+down_revision = '0379d7680eeb'
+branch_labels = None
+depends_on = None
+
+
+SOFT_DELETE_TABLES = ['company', 'card']
+
+INDEXES = {
+    'ix_card_user_id_id': ('card', ['user_id', 'id']),
+    'ix_transaction_timestamp': ('transaction', ['timestamp']),
+}
+
+# History indexes rebuilt with INCLUDE columns for index-only scans, only on PostgreSQL
+COVERING_INDEXES = {
+    'ix_transaction_company_id_timestamp_id': 'company_id, timestamp, id) INCLUDE (card_id, amount',
+    'ix_transaction_card_id_timestamp_id': 'card_id, timestamp, id) INCLUDE (company_id, amount',
+}
+
+# (table, column, referenced table, ON DELETE) of foreign keys given explicit rules:
+# the ledger blocks deletes, the derived daily rollup goes with its company
+FOREIGN_KEYS = [
+    ('transaction', 'card_id', 'card', 'RESTRICT'),
+    ('transaction', 'company_id', 'company', 'RESTRICT'),
+    ('card', 'user_id', 'user', 'RESTRICT'),
+    ('company_daily_total', 'company_id', 'company', 'CASCADE'),
+]
+
+
+# Names SQLite batch mode gives the unnamed foreign keys of the initial schema
+SQLITE_NAMING = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+
+def replace_foreign_keys(on_delete):
+    if op.get_context().dialect.name != 'postgresql':
+        # SQLite cannot alter constraints; batch mode copies each table
+        for table, column, referenced, rule in FOREIGN_KEYS:
+            name = f'fk_{table}_{column}_{referenced}'
+            with op.batch_alter_table(table, schema=None, naming_convention=SQLITE_NAMING) as batch_op:
+                batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(name, referenced, [column], ['id'], ondelete=on_delete or rule)
+        return
+
+    for table, column, referenced, rule in FOREIGN_KEYS:
+        name = f'{table}_{column}_fkey'
+        op.execute(f'ALTER TABLE "{table}" DROP CONSTRAINT {name}')
+        # NOT VALID first, so the check of existing rows does not block writes
+        op.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT {name} FOREIGN KEY ({column}) '
+                   f'REFERENCES "{referenced}" (id) ON DELETE {on_delete or rule} NOT VALID')
+        op.execute(f'ALTER TABLE "{table}" VALIDATE CONSTRAINT {name}')
+
+
+def upgrade():
+    for table in SOFT_DELETE_TABLES:
+        op.add_column(table, sa.Column('deleted_at', sa.DateTime(), nullable=True))
+
+    replace_foreign_keys(None)
+    if op.get_context().dialect.name != 'postgresql':
+        for name, (table, columns) in INDEXES.items():
+            with op.batch_alter_table(table, schema=None) as batch_op:
+                batch_op.create_index(name, columns, unique=False)
+        return
+
+    # Build the indexes without locking the card and transaction tables against payments
+    with op.get_context().autocommit_block():
+        for name, (table, columns) in INDEXES.items():
+            op.create_index(name, table, columns, unique=False,
+                            postgresql_concurrently=True, if_not_exists=True)
+        for name, columns in COVERING_INDEXES.items():
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name}_covering ON "transaction" ({columns})')
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+            op.execute(f'ALTER INDEX {name}_covering RENAME TO {name}')
+
+
+def downgrade():
+    if op.get_context().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, columns in COVERING_INDEXES.items():
+                plain_columns = columns.split(')')[0]
+                op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name}_plain ON "transaction" ({plain_columns})')
+                op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+                op.execute(f'ALTER INDEX {name}_plain RENAME TO {name}')
+    replace_foreign_keys('NO ACTION')
+
+    for name, (table, columns) in INDEXES.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(name)
+    for table in reversed(SOFT_DELETE_TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('deleted_at')
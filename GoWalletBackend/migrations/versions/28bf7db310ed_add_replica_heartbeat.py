@@ -0,0 +1,32 @@
+"""Add replica heartbeat
+
+Revision ID: 28bf7db310ed
+Revises: 0dae2903d5ad
+Create Date: 2026-10-18 10:57:35.977382
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '28bf7db310ed'
+down_revision = '0dae2903d5ad'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    heartbeat = op.create_table('replica_heartbeat',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('beat_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # The row the workers refresh, so they never race to insert it
+    op.bulk_insert(heartbeat, [{'id': 1, 'beat_at': datetime.utcnow()}])
+
+
+def downgrade():
+    op.drop_table('replica_heartbeat')
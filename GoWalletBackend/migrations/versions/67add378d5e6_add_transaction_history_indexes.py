@@ -0,0 +1,41 @@
+"""Add transaction history indexes
+
+Revision ID: 67add378d5e6
+Revises: 5c2e9f4a7d18
+Create Date: 2026-10-18 09:53:48.060422
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '67add378d5e6'
+down_revision = '5c2e9f4a7d18'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = {
+    'ix_transaction_company_id_timestamp_id': ['company_id', 'timestamp', 'id'],
+    'ix_transaction_card_id_timestamp_id': ['card_id', 'timestamp', 'id'],
+}
+
+
+def upgrade():
+    if op.get_context().dialect.name == 'postgresql':
+        # Build the indexes without locking the transaction table against payments
+        with op.get_context().autocommit_block():
+            for name, columns in INDEXES.items():
+                op.create_index(name, 'transaction', columns, unique=False,
+                                postgresql_concurrently=True, if_not_exists=True)
+        return
+
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        for name, columns in INDEXES.items():
+            batch_op.create_index(name, columns, unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        for name in INDEXES:
+            batch_op.drop_index(name)
@@ -0,0 +1,51 @@
+"""Store money as integer minor units
+
+Revision ID: 7b5d78f2b532
+Revises: c6be03afc976
+Create Date: 2026-10-18 10:06:56.986019
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b5d78f2b532'
+down_revision = 'c6be03afc976'
+branch_labels = None
+depends_on = None
+
+# Float amounts in sum become BIGINT amounts in tiyin
+MONEY_COLUMNS = [
+    ('card', 'balance'),
+    ('company_daily_total', 'total_amount'),
+    ('transaction', 'amount'),
+]
+
+
+def upgrade():
+    op.execute('UPDATE card SET balance = 0 WHERE balance IS NULL')
+    is_postgresql = op.get_bind().dialect.name == 'postgresql'
+    for table, column in MONEY_COLUMNS:
+        if not is_postgresql:
+            # SQLite copies the table in batch mode; scale the values in place first
+            op.execute(f'UPDATE "{table}" SET {column} = round({column} * 100)')
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(column,
+                   existing_type=sa.FLOAT(),
+                   type_=sa.BigInteger(),
+                   nullable=False,
+                   postgresql_using=f'round({column} * 100)::bigint')
+
+
+def downgrade():
+    is_postgresql = op.get_bind().dialect.name == 'postgresql'
+    for table, column in reversed(MONEY_COLUMNS):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(column,
+                   existing_type=sa.BigInteger(),
+                   type_=sa.FLOAT(),
+                   nullable=column != 'balance',
+                   postgresql_using=f'{column} / 100.0')
+        if not is_postgresql:
+            op.execute(f'UPDATE "{table}" SET {column} = {column} / 100.0')
@@ -0,0 +1,135 @@
+"""Partition transactions by month and store timestamps in UTC
+
+Revision ID: f9c4d421901e
+Revises: 14683957c76d
+Create Date: 2026-10-18 10:39:18.006453
+
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f9c4d421901e'
+down_revision = '14683957c76d'
+branch_labels = None
+depends_on = None
+
+
+# Timestamps were written in local time until now
+LOCAL_UTC_OFFSET = timedelta(hours=5)
+PARTITIONS_AHEAD = 3  # months after the current one; flask maintain-transactions keeps creating them
+
+INDEXES = {
+    'ix_transaction_company_id_timestamp_id': 'company_id, timestamp, id) INCLUDE (card_id, amount',
+    'ix_transaction_card_id_timestamp_id': 'card_id, timestamp, id) INCLUDE (company_id, amount',
+    'ix_transaction_timestamp': 'timestamp',
+}
+
+COLUMNS = 'id, card_id, company_id, amount, timestamp'
+
+
+def next_month(month):
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def create_table(primary_key, timestamp_null, partition_by=''):
+    op.execute(f'''
+        CREATE TABLE "transaction" (
+            id integer NOT NULL DEFAULT nextval('transaction_id_seq'::regclass),
+            card_id integer NOT NULL REFERENCES card (id) ON DELETE RESTRICT,
+            company_id integer NOT NULL REFERENCES company (id) ON DELETE RESTRICT,
+            amount bigint NOT NULL,
+            timestamp timestamp without time zone {timestamp_null},
+            PRIMARY KEY ({primary_key})
+        ) {partition_by}
+    ''')
+
+
+def set_aside(suffix):
+    """Renames the current transaction table and its indexes out of the way."""
+    op.execute('LOCK TABLE "transaction" IN ACCESS EXCLUSIVE MODE')
+    op.execute(f'ALTER TABLE "transaction" RENAME TO transaction_{suffix}')
+    op.execute(f'ALTER TABLE transaction_{suffix} RENAME CONSTRAINT transaction_pkey TO transaction_{suffix}_pkey')
+    for name in INDEXES:
+        op.execute(f'ALTER INDEX IF EXISTS {name} RENAME TO {name}_{suffix}')
+
+
+def copy_from(suffix, timestamp):
+    op.execute('ALTER SEQUENCE transaction_id_seq OWNED BY "transaction".id')
+    op.execute(f'INSERT INTO "transaction" ({COLUMNS}) '
+               f'SELECT id, card_id, company_id, amount, {timestamp} FROM transaction_{suffix}')
+    op.execute(f'DROP TABLE transaction_{suffix} CASCADE')
+    # Built after the copy, which is faster than maintaining them row by row
+    for name, columns in INDEXES.items():
+        op.execute(f'CREATE INDEX {name} ON "transaction" ({columns})')
+
+
+def shift_sqlite_timestamps(delta):
+    # SQLite has no interval arithmetic on the stored strings, so rows are shifted in Python
+    transaction = sa.table('transaction', sa.column('id', sa.Integer), sa.column('timestamp', sa.DateTime))
+    bind = op.get_bind()
+    rows = bind.execute(sa.select(transaction.c.id, transaction.c.timestamp)).all()
+    fallback = datetime.utcnow()
+    if rows:
+        bind.execute(
+            transaction.update().where(transaction.c.id == sa.bindparam('row_id'))
+            .values(timestamp=sa.bindparam('new_timestamp')),
+            [{'row_id': row.id, 'new_timestamp': row.timestamp + delta if row.timestamp else fallback}
+             for row in rows]
+        )
+
+
+def upgrade():
+    op.create_table('transaction_archive',
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('row_count', sa.Integer(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('month')
+    )
+
+    if op.get_context().dialect.name != 'postgresql':
+        # SQLite keeps a single table; maintain-transactions archives it by timestamp range
+        shift_sqlite_timestamps(-LOCAL_UTC_OFFSET)
+        with op.batch_alter_table('transaction', schema=None) as batch_op:
+            batch_op.alter_column('timestamp',
+                   existing_type=sa.DATETIME(),
+                   nullable=False)
+        return
+
+    # Rewrites the table: payments are blocked until the copy is done, run it in a quiet hour
+    first = op.get_bind().execute(sa.text('SELECT min(timestamp) FROM "transaction"')).scalar()
+    current = datetime.utcnow().date().replace(day=1)
+    month = (first - LOCAL_UTC_OFFSET).date().replace(day=1) if first else current
+    last = current
+    for _ in range(PARTITIONS_AHEAD):
+        last = next_month(last)
+
+    set_aside('unpartitioned')
+    # Unique constraints of a partitioned table must include the partition key
+    create_table('id, timestamp', 'NOT NULL', 'PARTITION BY RANGE (timestamp)')
+    while month <= last:
+        op.execute(f'CREATE TABLE transaction_{month:%Y_%m} PARTITION OF "transaction" '
+                   f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month(month):%Y-%m-%d}')")
+        month = next_month(month)
+    # Catches rows beyond the last partition instead of failing payments
+    op.execute('CREATE TABLE transaction_default PARTITION OF "transaction" DEFAULT')
+    copy_from('unpartitioned', "COALESCE(timestamp - INTERVAL '5 hours', now() AT TIME ZONE 'UTC')")
+
+
+def downgrade():
+    # Months already moved to the archive are not brought back
+    if op.get_context().dialect.name != 'postgresql':
+        with op.batch_alter_table('transaction', schema=None) as batch_op:
+            batch_op.alter_column('timestamp',
+                   existing_type=sa.DATETIME(),
+                   nullable=True)
+        shift_sqlite_timestamps(LOCAL_UTC_OFFSET)
+    else:
+        set_aside('partitioned')
+        create_table('id', 'NULL')
+        copy_from('partitioned', "timestamp + INTERVAL '5 hours'")
+
+    op.drop_table('transaction_archive')
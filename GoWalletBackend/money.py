@@ -0,0 +1,69 @@
+"""
+Money amounts.
+
+In Python an amount is a Decimal with two places; in the database it is a
+BIGINT of minor units (tiyin), so balances are debited and summed in exact
+integer arithmetic by SQL itself. JSON carries amounts as plain numbers.
+"""
+from decimal import Decimal, InvalidOperation
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy.types import BigInteger, TypeDecorator
+
+MINOR_UNITS = 100  # tiyin in one sum
+CENT = Decimal('0.01')
+MAX_MINOR_UNITS = 10 ** 15 - 1  # 15 digits: written to JSON exactly, see MoneyJSONProvider
+
+def to_money(value):
+    """
+    Decimal amount from a Decimal, int, float or numeric string. Floats are
+    read through their shortest repr, so 0.1 becomes exactly 0.10. Raises
+    ValueError for anything that is not a finite amount with at most two
+    places, or that is larger than MAX_MINOR_UNITS in minor units.
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid amount: {value!r}")
+    try:
+        amount = Decimal(repr(value) if isinstance(value, float) else str(value).strip())
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount: {value!r}") from None
+    if not amount.is_finite() or abs(amount) * MINOR_UNITS > MAX_MINOR_UNITS:
+        raise ValueError(f"Invalid amount: {value!r}")
+    if amount != amount.quantize(CENT, rounding='ROUND_DOWN'):
+        raise ValueError(f"Invalid amount: {value!r}")
+    return amount.quantize(CENT)
+
+def to_minor(amount):
+    return int(to_money(amount) * MINOR_UNITS)
+
+def from_minor(minor_units):
+    return (Decimal(int(minor_units)) / MINOR_UNITS).quantize(CENT)
+
+class Money(TypeDecorator):
+    """Column of Decimal amounts stored as integer minor units."""
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else to_minor(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else from_minor(value)
+
+class MoneyJSONProvider(DefaultJSONProvider):
+    """
+    Writes Decimal amounts as JSON numbers instead of strings. A decimal of
+    at most 15 significant digits survives the trip through a float, so for
+    amounts within MAX_MINOR_UNITS the float's shortest repr is exactly the
+    decimal amount. Beyond that it would be rounded, which is why to_money
+    refuses larger amounts.
+    """
+    @staticmethod
+    def default(o):
+        if isinstance(o, Decimal):
+            return float(o)
+        return DefaultJSONProvider.default(o)
+
+def average_amount(total, count):
+    """Average of `count` amounts summing to `total`, rounded to the tiyin."""
+    return (total / count).quantize(CENT) if count else from_minor(0)
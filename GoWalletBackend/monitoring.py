@@ -0,0 +1,112 @@
+"""
+Structured logging and per-request metrics.
+
+Log records of the "gowallet" logger are written as one JSON object per
+line, with the `extra` fields of the call as keys. Request metrics are kept
+per process in fixed-bucket histograms and exported in the Prometheus
+text format; with several workers every worker reports its own numbers.
+"""
+import json
+import logging
+import os
+import threading
+from bisect import bisect_left
+from datetime import datetime, timezone
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Attributes every LogRecord has; anything else on a record came from `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+def configure_logging(name='gowallet', level=None):
+    """Returns the app logger, writing JSON lines at LOG_LEVEL (INFO by default)."""
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(JsonFormatter())
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(level or os.environ.get('LOG_LEVEL', 'INFO').upper())
+    return logger
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense; not thread-safe on its own."""
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(float(bound))
+            yield f'{name}_bucket{_labels(labels, le=le)} {cumulative}'
+        yield f'{name}_sum{_labels(labels)} {self.sum}'
+        yield f'{name}_count{_labels(labels)} {self.count}'
+
+def _labels(labels, **extra):
+    items = list(labels.items()) + list(extra.items())
+    if not items:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for _, value in items)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(items, escaped)) + '}'
+
+class RequestMetrics:
+    """Latency, SQL statement count and DB time per endpoint, plus request counts per status."""
+    HISTOGRAMS = (
+        ('gowallet_request_duration_seconds', 'Time spent handling a request.', LATENCY_BUCKETS),
+        ('gowallet_request_sql_statements', 'SQL statements executed by a request.', STATEMENT_BUCKETS),
+        ('gowallet_request_db_seconds', 'Time a request spent waiting on SQL statements.', LATENCY_BUCKETS),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {name: {} for name, _, _ in self.HISTOGRAMS}
+        self._requests = {}
+
+    def observe(self, endpoint, method, status, duration, statements, db_time):
+        key = (endpoint, method)
+        values = (duration, statements, db_time)
+        with self._lock:
+            for (name, _, buckets), value in zip(self.HISTOGRAMS, values):
+                histogram = self._histograms[name].get(key)
+                if histogram is None:
+                    histogram = self._histograms[name][key] = Histogram(buckets)
+                histogram.observe(value)
+            self._requests[key + (status,)] = self._requests.get(key + (status,), 0) + 1
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines.append('# HELP gowallet_requests_total Requests handled, by status code.')
+            lines.append('# TYPE gowallet_requests_total counter')
+            for (endpoint, method, status), count in sorted(self._requests.items()):
+                lines.append(f'gowallet_requests_total{_labels({"endpoint": endpoint, "method": method, "status": status})} {count}')
+            for name, help_text, _ in self.HISTOGRAMS:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for (endpoint, method), histogram in sorted(self._histograms[name].items()):
+                    lines.extend(histogram.samples(name, {'endpoint': endpoint, 'method': method}))
+        return '\n'.join(lines) + '\n'
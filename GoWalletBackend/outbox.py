@@ -0,0 +1,202 @@
+"""
+Payment events for merchants.
+
+The payment engine writes a PaymentEvent row (app.py) in the same database
+transaction as every payment, so an event exists exactly when its payment
+was committed. Two readers consume these outbox rows:
+
+- `flask dispatch-webhooks` claims due events and POSTs them in batches, one
+  request per merchant, to the merchant's webhook URL. Failed deliveries are
+  retried with exponential backoff. Every event is delivered at least once,
+  so merchants deduplicate by event id. The body is signed with the
+  merchant's secret.
+- EventFeed lets the company transactions page wait for new payments. One
+  poller thread per worker reads the new events for all waiting pages.
+"""
+import hashlib
+import hmac
+import logging
+import random
+import secrets
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from datetime import datetime, timedelta
+
+WEBHOOK_BATCH_SIZE = 100     # events per request to a merchant
+WEBHOOK_CLAIM_SIZE = 1000    # events claimed per dispatcher round
+WEBHOOK_TIMEOUT = 10         # seconds
+WEBHOOK_WORKERS = 8          # merchants delivered to concurrently
+WEBHOOK_LEASE = 60           # seconds a claimed event stays with its dispatcher
+WEBHOOK_RETRY_BACKOFF = 5    # seconds before the first retry, doubled on every attempt
+WEBHOOK_MAX_BACKOFF = 3600
+WEBHOOK_MAX_ATTEMPTS = 30    # about a day of retries, then the event waits for --requeue-failed
+SIGNATURE_HEADER = 'X-GoWallet-Signature'
+
+FEED_POLL_INTERVAL = 1.0     # seconds between reads of the outbox while pages wait
+FEED_SETTLE_SECONDS = 5      # events younger than this are read again, see EventFeed
+FEED_FETCH_LIMIT = 1000      # events read per poll
+FEED_BUFFER_SIZE = 5000      # recent events kept for waiting pages
+FEED_IDLE_SECONDS = 60       # the poller stops when no page waited for this long
+FEED_MAX_WAITERS = 2         # pages waiting at once per worker, each holds a server thread
+
+logger = logging.getLogger("gowallet")
+
+class WebhookError(Exception):
+    """A merchant's endpoint did not accept a batch."""
+
+def new_webhook_secret():
+    return secrets.token_hex(32)
+
+def sign(secret, body):
+    return 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+def webhook_backoff(attempts):
+    """Seconds until the next delivery of an event after `attempts` failed ones, with jitter."""
+    return min(WEBHOOK_RETRY_BACKOFF * 2 ** (attempts - 1), WEBHOOK_MAX_BACKOFF) * random.uniform(0.8, 1.2)
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # A redirected POST would be repeated as a GET without the events; count it as a failure
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+_opener = urllib.request.build_opener(_NoRedirect)
+
+def post_events(url, secret, body, timeout=WEBHOOK_TIMEOUT):
+    """POSTs a JSON batch to a merchant. Any 2xx answer accepts it; raises WebhookError otherwise."""
+    request = urllib.request.Request(url, data=body, method='POST', headers={
+        'Content-Type': 'application/json',
+        'User-Agent': 'GoWallet-Webhooks/1',
+        SIGNATURE_HEADER: sign(secret, body),
+    })
+    try:
+        with _opener.open(request, timeout=timeout) as response:
+            response.read()
+    except urllib.error.HTTPError as e:
+        raise WebhookError(f"HTTP {e.code}")
+    except urllib.error.URLError as e:
+        raise WebhookError(str(e.reason))
+    except (OSError, ValueError) as e:
+        raise WebhookError(str(e) or type(e).__name__)
+
+class EventFeed:
+    """
+    New payment events for pages that long-poll, read by one poller thread
+    per worker however many pages wait.
+
+    fetch(after, company_id=None) returns up to FEED_FETCH_LIMIT events
+    (dicts with at least 'id', 'company_id' and 'created_at') with ids above
+    `after`, in id order; latest() returns the highest id. Ids are assigned
+    before a payment commits, so a payment can commit after one with a
+    higher id. The poller therefore reads the events of the last
+    FEED_SETTLE_SECONDS again and adds the late ones, but a page whose
+    cursor has already passed such an id shows it only on its next reload.
+    """
+    def __init__(self, fetch, latest, interval=FEED_POLL_INTERVAL, max_waiters=FEED_MAX_WAITERS):
+        self.fetch = fetch
+        self.latest = latest
+        self.interval = interval
+        self.max_waiters = max_waiters
+        self.app = None
+        self._cond = threading.Condition()
+        self._wake = threading.Event()
+        self._events = deque(maxlen=FEED_BUFFER_SIZE)
+        self._seen = set()      # ids above the horizon that are in the buffer
+        self._horizon = None    # the poller reads events above this id
+        self._floor = None      # events up to this id may be missing from the buffer
+        self._waiters = 0
+        self._last_wait = 0.0
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+
+    def notify(self):
+        """A payment was committed in this process: read the outbox now rather than at the next interval."""
+        self._wake.set()
+
+    def wait(self, company_id, after, timeout):
+        """
+        Events of `company_id` with ids above `after`, waiting up to `timeout`
+        seconds for the first one. Returns None at once if max_waiters pages
+        are waiting already.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if self._waiters >= self.max_waiters:
+                return None
+            self._waiters += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._poll, name="payment-feed", daemon=True)
+                self._thread.start()
+        try:
+            with self._cond:
+                while self._floor is None and time.monotonic() < deadline:
+                    self._cond.wait(deadline - time.monotonic())
+                floor = self._floor
+            if floor is None:
+                return []
+            if after < floor:
+                # The buffer does not reach back that far, e.g. the page was loaded before the poller started
+                events = self.fetch(after, company_id)
+                if events:
+                    return events
+                after = floor
+            with self._cond:
+                while True:
+                    events = [event for event in self._events
+                              if event['company_id'] == company_id and event['id'] > after]
+                    remaining = deadline - time.monotonic()
+                    if events or remaining <= 0:
+                        return sorted(events, key=lambda event: event['id'])
+                    self._cond.wait(remaining)
+        finally:
+            with self._cond:
+                self._waiters -= 1
+                self._last_wait = time.monotonic()
+
+    def _poll(self):
+        while True:
+            with self._cond:
+                if not self._waiters and time.monotonic() - self._last_wait > FEED_IDLE_SECONDS:
+                    # Nobody waits any more; the next wait() starts afresh from the latest event
+                    self._thread = None
+                    self._events.clear()
+                    self._seen.clear()
+                    self._horizon = self._floor = None
+                    return
+                horizon = self._horizon
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    if horizon is None:
+                        latest, events = self.latest(), []
+                    else:
+                        events = self.fetch(horizon)
+            except Exception:
+                logger.exception("payment feed poll failed")
+                self._wake.wait(self.interval)
+                continue
+
+            settled = datetime.utcnow() - timedelta(seconds=FEED_SETTLE_SECONDS)
+            with self._cond:
+                if horizon is None:
+                    self._horizon = self._floor = latest
+                for event in events:
+                    if event['id'] in self._seen:
+                        continue
+                    if len(self._events) == self._events.maxlen:
+                        self._floor = max(self._floor, self._events[0]['id'])
+                    self._events.append(event)
+                    self._seen.add(event['id'])
+                # Payments older than FEED_SETTLE_SECONDS have committed, they are not read again
+                settled_ids = [event['id'] for event in events if event['created_at'] <= settled]
+                if len(events) >= FEED_FETCH_LIMIT:
+                    settled_ids.append(events[-1]['id'])  # a burst; do not read the same page forever
+                if settled_ids:
+                    self._horizon = max(self._horizon, max(settled_ids))
+                    self._seen = {event_id for event_id in self._seen if event_id > self._horizon}
+                self._cond.notify_all()
+            self._wake.wait(self.interval)
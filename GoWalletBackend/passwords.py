@@ -0,0 +1,104 @@
+"""
+Password hashing off the request threads.
+
+Hashing and verifying passwords is deliberately slow. Done inline, a burst
+of logins keeps every worker thread busy on the key derivation and payments
+wait behind it. Here the work runs on a small process pool of its own at a
+lower CPU priority, and at most `workers + queue` hashes are admitted at a
+time; past that, callers get PasswordHasherBusy at once and the route
+answers 503. A request waiting for a hash still holds its thread, so keep
+`workers + queue` below the server's threads per worker to leave threads
+free for other requests. The method string is configurable, and hashes
+made with another method are reported by needs_rehash so they can be
+upgraded on the next login.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'  # werkzeug's default
+HASHER_NICENESS = 10  # request handling gets the CPU first when both compete
+
+class PasswordHasherBusy(Exception):
+    """More hashes are in flight than the pool admits."""
+
+class PasswordHasher:
+    """
+    Hashes and verifies passwords on a bounded process pool.
+
+    With workers=0 the work is done inline in the calling thread, which
+    is what CLI commands and single-threaded tools want.
+    """
+    def __init__(self, method=DEFAULT_METHOD, workers=1, queue=2):
+        self.configure(method, workers, queue)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def configure(self, method, workers, queue):
+        self.method = method
+        # werkzeug fills in the defaults of a short method ('scrypt', 'pbkdf2:sha256') when it
+        # writes the hash, so compare stored hashes against the prefix it actually writes
+        self._prefix = generate_password_hash('', method).split('$', 1)[0]
+        self.workers = workers
+        self.queue = queue
+        self._slots = threading.BoundedSemaphore(workers + queue) if workers else None
+
+    def init_app(self, app):
+        self.configure(app.config['PASSWORD_HASH_METHOD'],
+                       app.config['PASSWORD_HASH_WORKERS'],
+                       app.config['PASSWORD_HASH_QUEUE'])
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def hash_many(self, passwords, workers=None):
+        """
+        Hashes a batch of passwords on a one-off pool of `workers` processes
+        (default: one per CPU core), for bulk imports. It bypasses the
+        admission limit, which is there to keep logins in check.
+        """
+        passwords = list(passwords)
+        hash_one = partial(generate_password_hash, method=self.method)
+        workers = workers or os.cpu_count()
+        if workers == 1 or len(passwords) < 2:
+            return [hash_one(password) for password in passwords]
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=os.nice, initargs=(HASHER_NICENESS,)) as pool:
+            return list(pool.map(hash_one, passwords, chunksize=max(1, len(passwords) // (workers * 8))))
+
+    def needs_rehash(self, password_hash):
+        """True for hashes made with a method other than the configured one."""
+        return password_hash.split('$', 1)[0] != self._prefix
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            return self._pool().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def _pool(self):
+        # Created on first use, in the serving process. Children are spawned
+        # rather than forked from the threaded server, so scripts that hash
+        # passwords need the usual `if __name__ == "__main__"` guard
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                                     initializer=os.nice, initargs=(HASHER_NICENESS,))
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
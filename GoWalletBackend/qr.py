@@ -0,0 +1,132 @@
+"""
+QR code rendering for merchant deep links.
+
+Rendered PNGs are cached on disk under a name derived from the deep link,
+so a file never has to be invalidated: a new account number simply maps to
+a new file. Rendering runs on a small background pool, off the request
+thread, and the bulk job spreads it across processes.
+
+Other sizes and formats are rendered straight into memory and kept in a
+byte-bounded LRU of variants.
+"""
+import hashlib
+import io
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import qrcode
+import qrcode.image.svg
+from PIL import Image
+
+from cache import LRUCache
+
+APP_SCHEME = "gowallet://company/"
+QR_FOLDER = "static/qrcodes"
+QR_RENDER_WORKERS = 2  # background threads rendering QR codes for requests
+
+QR_FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+QR_DEFAULT_SIZE = 512
+QR_MIN_SIZE = 64
+QR_MAX_SIZE = 2048
+QR_VARIANT_CACHE_BYTES = 32 * 1024 * 1024
+QR_RENDER_VERSION = 1  # bump when the rendering changes, it is part of the ETag
+
+variant_cache = LRUCache(QR_VARIANT_CACHE_BYTES, weigh=len)
+
+_executor = ThreadPoolExecutor(max_workers=QR_RENDER_WORKERS, thread_name_prefix="qr-render")
+_pending = {}  # path -> Future of a render in progress
+_pending_lock = threading.Lock()
+
+def deep_link(account_number):
+    return f"{APP_SCHEME}{account_number}"
+
+def qr_path(account_number):
+    """Cache location of the QR code PNG, addressed by the hash of the deep link."""
+    digest = hashlib.sha256(deep_link(account_number).encode()).hexdigest()
+    return os.path.join(QR_FOLDER, f"{digest[:32]}.png")
+
+def render_qr(account_number, force=False):
+    """Renders the QR code into the cache unless it is already there. Returns its path."""
+    path = qr_path(account_number)
+    if not force and os.path.exists(path):
+        return path
+
+    os.makedirs(QR_FOLDER, exist_ok=True)
+    # Write to a temporary file first so readers never see a half-written PNG
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    qrcode.make(deep_link(account_number)).save(tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+def render_qr_async(account_number):
+    """Schedules rendering on the background pool. Returns a Future with the path."""
+    path = qr_path(account_number)
+    with _pending_lock:
+        future = _pending.get(path)
+        is_new = future is None
+        if is_new:
+            future = _pending[path] = _executor.submit(render_qr, account_number)
+    if is_new:
+        future.add_done_callback(lambda _: _forget(path))
+    return future
+
+def _forget(path):
+    with _pending_lock:
+        _pending.pop(path, None)
+
+def ensure_qr(account_number):
+    """Path of a rendered QR code, rendering it now if it is missing."""
+    path = qr_path(account_number)
+    if os.path.exists(path):
+        return path
+    return render_qr_async(account_number).result()
+
+def _render_forced(account_number):
+    return render_qr(account_number, force=True)
+
+def render_all(account_numbers, workers=None, force=False):
+    """Renders many QR codes in parallel across processes. Returns the paths, in order."""
+    render = _render_forced if force else render_qr
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(render, account_numbers, chunksize=64))
+
+def variant_etag(account_number, fmt, size):
+    """Strong ETag of a rendered variant; rendering is deterministic, so no bytes are needed."""
+    key = f"{QR_RENDER_VERSION}|{deep_link(account_number)}|{fmt}|{size}"
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+def clamp_size(size):
+    return min(max(size or QR_DEFAULT_SIZE, QR_MIN_SIZE), QR_MAX_SIZE)
+
+def render_variant(account_number, fmt='png', size=QR_DEFAULT_SIZE):
+    """Renders the QR code as PNG or SVG bytes of `size` pixels, without touching the disk."""
+    qr = qrcode.QRCode(border=4)
+    qr.add_data(deep_link(account_number))
+    qr.make(fit=True)
+    modules = qr.modules_count + 2 * qr.border
+    buffer = io.BytesIO()
+
+    if fmt == 'svg':
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buffer)
+        # The drawing is a vector in its viewBox; only the nominal width and height change
+        return re.sub(rb'width="[^"]*" height="[^"]*"', f'width="{size}" height="{size}"'.encode(),
+                      buffer.getvalue(), count=1)
+    else:
+        qr.box_size = max(size // modules, 1)
+        image = qr.make_image().get_image().convert('1')
+        if image.size != (size, size):
+            image = image.resize((size, size), Image.NEAREST)
+        image.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+def get_variant(account_number, fmt='png', size=QR_DEFAULT_SIZE, cache=True):
+    """Rendered variant bytes, from the LRU when possible. cache=False skips filling it."""
+    key = (account_number, fmt, size)
+    data = variant_cache.get(key)
+    if data is None:
+        data = render_variant(account_number, fmt, size)
+        if cache:
+            variant_cache.set(key, data)
+    return data
@@ -0,0 +1,226 @@
+"""
+Rate limits and velocity rules, checked in memory before any database work.
+
+A Limit is a token bucket: `burst` requests at once, refilled at `rate`
+per second. A Velocity rule caps the number and the total amount of
+payments of a key (a card) within a sliding window of `window` seconds.
+Amounts are integers (minor units).
+
+State lives in a backend. MemoryBackend keeps it in the worker process, in
+lock-striped shards so concurrent requests rarely contend; with several
+workers each enforces the limits on its own share of the traffic.
+RedisBackend keeps it in Redis, or any server speaking its protocol (e.g.
+a local Valkey or KeyDB next to the workers), so all workers share one
+budget.
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+
+import redis
+
+Limit = namedtuple('Limit', ['name', 'rate', 'burst'])  # rate in tokens per second
+Velocity = namedtuple('Velocity', ['name', 'window', 'max_count', 'max_amount'])  # max_amount None: count only
+
+class RateLimited(Exception):
+    """A limit is exhausted; the request may be retried after `retry_after` seconds."""
+    def __init__(self, name, retry_after):
+        super().__init__(f"Rate limit '{name}' exceeded")
+        self.name = name
+        self.retry_after = retry_after
+
+class MemoryBackend:
+    """Token buckets and velocity windows in this process, in `shards` independently locked dicts."""
+    def __init__(self, shards=64, max_keys=100000):
+        self.shards = [(threading.Lock(), OrderedDict()) for _ in range(shards)]
+        self.max_keys = max(max_keys // shards, 1)  # per shard; the least recently used key is dropped
+        self._entry_ids = itertools.count()
+
+    def _shard(self, key):
+        return self.shards[hash(key) % len(self.shards)]
+
+    def _touch(self, data, key, default):
+        state = data.get(key)
+        if state is None:
+            state = data[key] = default()
+            if len(data) > self.max_keys:
+                # Dropping a key forgets its history, which only ever lets a request through
+                data.popitem(last=False)
+        else:
+            data.move_to_end(key)
+        return state
+
+    def take(self, key, rate, burst, now):
+        """Takes a token from the bucket of `key`; returns 0, or the seconds until one is available."""
+        lock, data = self._shard(key)
+        with lock:
+            state = self._touch(data, key, lambda: [burst, now])
+            tokens = min(burst, state[0] + (now - state[1]) * rate)
+            state[1] = now
+            if tokens >= 1:
+                state[0] = tokens - 1
+                return 0
+            state[0] = tokens
+            return (1 - tokens) / rate
+
+    def add(self, key, window, max_count, max_amount, amount, now):
+        """
+        Records a payment of `amount` in the window of `key` if it stays within
+        the rule. Returns (entry, 0), or (None, seconds until it would fit).
+        """
+        lock, data = self._shard(key)
+        with lock:
+            state = self._touch(data, key, lambda: [deque(), 0])
+            entries = state[0]
+            while entries and entries[0][0] <= now - window:
+                state[1] -= entries.popleft()[1]
+            too_many = len(entries) + 1 > max_count
+            too_much = max_amount is not None and state[1] + amount > max_amount
+            if too_many or too_much:
+                return None, self._wait(entries, state[1], window, max_count, max_amount, amount, now)
+            entry = (now, amount, next(self._entry_ids))
+            entries.append(entry)
+            state[1] += amount
+            return entry, 0
+
+    @staticmethod
+    def _wait(entries, total, window, max_count, max_amount, amount, now):
+        # Until enough of the oldest entries have left the window
+        count = len(entries)
+        for timestamp, entry_amount, _ in entries:
+            count -= 1
+            total -= entry_amount
+            if count + 1 <= max_count and (max_amount is None or total + amount <= max_amount):
+                return timestamp + window - now
+        return window  # larger than max_amount on its own: the rule rejects it regardless
+
+    def remove(self, key, entry):
+        """Takes a recorded payment back out of the window, e.g. when it was declined."""
+        lock, data = self._shard(key)
+        with lock:
+            state = data.get(key)
+            if state is not None and entry in state[0]:
+                state[0].remove(entry)
+                state[1] -= entry[1]
+
+    def clear(self):
+        for lock, data in self.shards:
+            with lock:
+                data.clear()
+
+# Redis scripts; run atomically on the server, timestamps come from the workers (time.time())
+TAKE_SCRIPT = """
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens, at = tonumber(state[1]) or burst, tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(now - at, 0) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+ADD_SCRIPT = """
+local window, max_count, max_amount = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local amount, now, member = tonumber(ARGV[4]), tonumber(ARGV[5]), ARGV[6]
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local entries = redis.call('ZRANGE', KEYS[1], 0, -1, 'WITHSCORES')
+local count, total = #entries / 2, 0
+for i = 1, #entries, 2 do total = total + tonumber(string.match(entries[i], ':(%-?%d+)$')) end
+if count + 1 <= max_count and (max_amount < 0 or total + amount <= max_amount) then
+    redis.call('ZADD', KEYS[1], now, member)
+    redis.call('PEXPIRE', KEYS[1], math.ceil(window * 1000))
+    return '0'
+end
+for i = 1, #entries, 2 do
+    count = count - 1
+    total = total - tonumber(string.match(entries[i], ':(%-?%d+)$'))
+    if count + 1 <= max_count and (max_amount < 0 or total + amount <= max_amount) then
+        return tostring(tonumber(entries[i + 1]) + window - now)
+    end
+end
+return tostring(window)
+"""
+
+class RedisBackend:
+    """The MemoryBackend operations on a Redis server, shared by all workers."""
+    def __init__(self, url, prefix='gowallet:ratelimit:'):
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._take = self.client.register_script(TAKE_SCRIPT)
+        self._add = self.client.register_script(ADD_SCRIPT)
+        self._entry_ids = itertools.count()
+        self._instance = f"{time.time_ns()}-{threading.get_native_id()}"
+
+    def take(self, key, rate, burst, now):
+        return float(self._take(keys=[self.prefix + key], args=[rate, burst, now]))
+
+    def add(self, key, window, max_count, max_amount, amount, now):
+        member = f"{self._instance}-{next(self._entry_ids)}:{amount}"
+        wait = float(self._add(keys=[self.prefix + key],
+                               args=[window, max_count, -1 if max_amount is None else max_amount, amount, now, member]))
+        return (member, 0) if wait == 0 else (None, wait)
+
+    def remove(self, key, entry):
+        self.client.zrem(self.prefix + key, entry)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+def make_backend(storage):
+    """A backend for a RATE_LIMIT_STORAGE setting: 'memory' or a redis:// URL."""
+    if storage in (None, '', 'memory'):
+        return MemoryBackend()
+    return RedisBackend(storage)
+
+class RateLimiter:
+    """Checks Limits and Velocity rules against a backend; disabled, every check passes."""
+    def __init__(self, backend=None, enabled=True):
+        self.backend = backend or MemoryBackend()
+        self.enabled = enabled
+        # The backends keep monotonic time per process; Redis needs a clock all workers share
+        self.clock = time.monotonic
+
+    def init_app(self, app):
+        self.backend = make_backend(app.config['RATE_LIMIT_STORAGE'])
+        self.enabled = app.config['RATE_LIMIT_ENABLED']
+        self.clock = time.monotonic if isinstance(self.backend, MemoryBackend) else time.time
+
+    def hit(self, *checks):
+        """
+        Takes a token for every (Limit, key) pair. Raises RateLimited for the
+        first exhausted one; tokens already taken stay taken.
+        """
+        if not self.enabled:
+            return
+        now = self.clock()
+        for limit, key in checks:
+            wait = self.backend.take(f"{limit.name}:{key}", limit.rate, limit.burst, now)
+            if wait:
+                raise RateLimited(limit.name, wait)
+
+    def record(self, rules, key, amount):
+        """
+        Records a payment of `amount` under every Velocity rule of `key`, or
+        none of them: raises RateLimited if one of the rules would be exceeded.
+        Returns a reservation to pass to release() if the payment does not happen.
+        """
+        if not self.enabled:
+            return []
+        now = self.clock()
+        reservation = []
+        for rule in rules:
+            rule_key = f"{rule.name}:{key}"
+            entry, wait = self.backend.add(rule_key, rule.window, rule.max_count, rule.max_amount, amount, now)
+            if entry is None:
+                self.release(reservation)
+                raise RateLimited(rule.name, wait)
+            reservation.append((rule_key, entry))
+        return reservation
+
+    def release(self, reservation):
+        for rule_key, entry in reservation:
+            self.backend.remove(rule_key, entry)
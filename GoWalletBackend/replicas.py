@@ -0,0 +1,94 @@
+"""
+Routing of read-only requests to a read replica.
+
+Views decorated with @read_replica (app.py) run their SELECTs on the
+replica named by DATABASE_REPLICA_URL; writes, and every other view, stay
+on the primary. A view is sent back to the primary:
+
+- while the replica is more than REPLICA_MAX_LAG seconds behind, or cannot
+  be reached. One monitor thread per worker writes a heartbeat on the
+  primary and reads it back from the replica every REPLICA_CHECK_INTERVAL
+  seconds; this works the same for a streaming PostgreSQL replica and for
+  a copy of a SQLite file.
+- for a client whose last write the replica may not have yet, so people
+  see their own payments right away. A response to a request that wrote
+  carries the time of the write in a signed cookie and header (app.py),
+  which the client sends back; its reads go to the replica once the
+  replica has a heartbeat written after that time. The marker travels with
+  the client, so this holds whichever worker or process answers it.
+- when a query on the replica fails; the view runs again on the primary.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+
+REPLICA_MAX_LAG = 5           # seconds; measured to within REPLICA_CHECK_INTERVAL
+REPLICA_CHECK_INTERVAL = 1.0  # seconds between lag measurements
+
+logger = logging.getLogger("gowallet")
+
+class ReplicaRouter:
+    """
+    Decides per request whether reads may go to the replica. heartbeat()
+    runs in an app context on the monitor thread; it refreshes the heartbeat
+    on the primary and returns the one the replica has (naive UTC), or
+    raises if either database cannot be reached.
+    """
+    def __init__(self, heartbeat, max_lag=REPLICA_MAX_LAG, interval=REPLICA_CHECK_INTERVAL):
+        self.heartbeat = heartbeat
+        self.max_lag = max_lag
+        self.interval = interval
+        self.app = None
+        self.enabled = False
+        self.healthy = False  # until the first measurement
+        self.lag = None
+        self.replayed_at = None  # the primary's time the replica had caught up to at the last measurement
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = 'replica' in (app.config.get('SQLALCHEMY_BINDS') or {})
+
+    def use_replica(self, written_at=None):
+        """Whether the reads of a request may go to the replica; `written_at` is the time of the client's last write."""
+        if not self.enabled:
+            return False
+        if self._thread is None:
+            self._start()
+        replayed_at = self.replayed_at
+        return self.healthy and (written_at is None or (replayed_at is not None and written_at <= replayed_at))
+
+    def mark_down(self):
+        """A query on the replica failed: use the primary until the next measurement succeeds."""
+        if self.healthy:
+            logger.warning("read replica failed, reading from the primary")
+        self.healthy = False
+
+    def _start(self):
+        # Started on first use rather than in init_app, so each forked worker gets its own
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._monitor, name="replica-monitor", daemon=True)
+                self._thread.start()
+
+    def _monitor(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    replayed_at = self.heartbeat()
+                lag = max((datetime.utcnow() - replayed_at).total_seconds(), 0.0)
+                error = None
+            except Exception as e:
+                replayed_at, lag, error = None, None, e
+            healthy = lag is not None and lag <= self.max_lag
+            if healthy != self.healthy:
+                if healthy:
+                    logger.info("read replica in use", extra={'lag_ms': round(lag * 1000)})
+                elif error is not None:
+                    logger.warning("read replica unreachable, reading from the primary", extra={'error': str(error)})
+                else:
+                    logger.warning("read replica lagging, reading from the primary", extra={'lag_ms': round(lag * 1000)})
+            self.lag, self.replayed_at, self.healthy = lag, replayed_at, healthy
+            time.sleep(self.interval)
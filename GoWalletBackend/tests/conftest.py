@@ -0,0 +1,113 @@
+"""
+Shared fixtures. The tests run against a throwaway SQLite file unless
+TEST_DATABASE_URL is set; every test starts from empty tables, so never
+point it at a database whose data you want to keep.
+"""
+import contextlib
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+
+folder = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = os.environ.get("TEST_DATABASE_URL") or "sqlite:///" + os.path.join(folder, "test.db")
+os.environ["TRANSACTION_ARCHIVE_FOLDER"] = os.path.join(folder, "archive")
+os.environ["PASSWORD_HASH_WORKERS"] = "0"
+os.environ["RATE_LIMIT_ENABLED"] = "0"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as gowallet  # noqa: E402
+from app import create_app, db, issue_token, Card, Company, Transaction, User  # noqa: E402
+
+@pytest.fixture
+def app():
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    # The in-process caches outlive the app; ids start over in every test
+    for cache in (gowallet.company_cache, gowallet.wallet_cache, gowallet.wallet_invalidations, gowallet.principal_cache,
+                  gowallet.user_revocations, gowallet.idempotency_cache, gowallet.archive_months_cache):
+        cache.clear()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def make_user(app):
+    """make_user(phone) adds a user with `cards` cards and returns (user_id, [card ids], auth headers)."""
+    def make(phone, cards=1, balance=1000):
+        with app.app_context():
+            user = User(name=f"User {phone}", phone=phone, password_hash="-")
+            db.session.add(user)
+            db.session.flush()
+            rows = [Card(user_id=user.id, card_number=f"4{user.id:07d}{i:08d}", balance=balance) for i in range(cards)]
+            db.session.add_all(rows)
+            db.session.commit()
+            return user.id, [card.id for card in rows], {"Authorization": "Bearer " + issue_token(user)}
+    return make
+
+@pytest.fixture
+def make_company(app):
+    def make(account_number, **columns):
+        with app.app_context():
+            company = Company(name=f"Shop {account_number}", account_number=account_number, qr_code="", **columns)
+            db.session.add(company)
+            db.session.commit()
+            return company.id
+    return make
+
+@pytest.fixture
+def seed_history(app):
+    """
+    seed_history(company_id, card_ids, transactions) inserts `transactions` payments
+    on every card, `ties` of them to a timestamp, and returns the (timestamp, id)
+    of the new rows in id order.
+    """
+    def seed(company_id, card_ids, transactions, ties=1):
+        rng = random.Random(7)
+        start = datetime(2025, 1, 1)
+        with app.app_context():
+            first_id = db.session.query(db.func.max(Transaction.id)).scalar() or 0
+            db.session.execute(Transaction.__table__.insert(), [{
+                "card_id": card_id,
+                "company_id": company_id,
+                "amount": rng.randint(1, 100000),
+                "timestamp": start + timedelta(minutes=i // ties),
+            } for i in range(transactions) for card_id in card_ids])
+            db.session.commit()
+            return db.session.query(Transaction.timestamp, Transaction.id) \
+                .filter(Transaction.id > first_id).order_by(Transaction.id).all()
+    return seed
+
+@pytest.fixture
+def count_statements(app):
+    """
+    `with count_statements() as counter:` counts the SQL statements run on the
+    database in the block; counter.statements holds their text.
+    """
+    with app.app_context():
+        engine = db.engine
+    @contextlib.contextmanager
+    def count():
+        counter = SimpleNamespace(count=0, statements=[])
+        def on_execute(connection, cursor, statement, *args):
+            counter.count += 1
+            counter.statements.append(statement)
+        event.listen(engine, "before_cursor_execute", on_execute)
+        try:
+            yield counter
+        finally:
+            event.remove(engine, "before_cursor_execute", on_execute)
+    return count
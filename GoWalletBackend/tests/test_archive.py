@@ -0,0 +1,53 @@
+import random
+from datetime import datetime, timedelta
+
+import archive
+from archive import write_month, read_month
+from app import db, archive_months_cache, Transaction
+
+def month_rows(count, cards=3):
+    rng = random.Random(5)
+    start = datetime(2025, 3, 1)
+    return [{"id": i + 1, "card_id": rng.randrange(cards) + 1, "company_id": 1, "amount": rng.randint(1, 10 ** 6),
+             "timestamp": start + timedelta(minutes=i // 2)} for i in range(count)]
+
+def test_read_month_streams_in_both_directions(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_CHUNK_ROWS", 7)  # cards span several gzip members
+    rows = month_rows(200)
+    def rows_by(key):
+        return sorted(rows, key=lambda row: (row[key], row["timestamp"], row["id"]), reverse=True)
+    month = datetime(2025, 3, 1)
+    assert write_month(str(tmp_path), month, rows_by) == 200
+
+    for card_id in (1, 2, 3):
+        newest_first = [row for row in rows_by("card_id") if row["card_id"] == card_id]
+        assert list(read_month(str(tmp_path), month, "card_id", card_id)) == newest_first
+        assert list(read_month(str(tmp_path), month, "card_id", card_id, oldest_first=True)) == newest_first[::-1]
+    assert list(read_month(str(tmp_path), month, "card_id", 99)) == []
+
+    # Only as much as is consumed is decompressed
+    first = next(read_month(str(tmp_path), month, "company_id", 1))
+    assert first == rows_by("company_id")[0]
+
+def test_export_reads_archived_months(app, client, make_user, make_company, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_CHUNK_ROWS", 10)
+    _, card_ids, headers = make_user("+998000000001", cards=2)
+    company_id = make_company("ARCH00000000000000001")
+    start = datetime.utcnow().replace(day=1) - timedelta(days=200)
+    with app.app_context():
+        db.session.execute(Transaction.__table__.insert(), [{
+            "card_id": card_ids[i % 2], "company_id": company_id, "amount": i + 1,
+            "timestamp": start + timedelta(hours=i * 5),
+        } for i in range(500)])
+        db.session.commit()
+
+    csv_before = client.get(f"/company/{company_id}/transactions.csv").data
+    history_before = client.get(f"/card/{card_ids[0]}/transactions?limit=100", headers=headers).json
+    result = app.test_cli_runner().invoke(args=["maintain-transactions", "--keep-months", "1"])
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        assert db.session.query(Transaction).count() < 500
+    archive_months_cache.clear()  # as on a worker that did not run the archiving
+
+    assert client.get(f"/company/{company_id}/transactions.csv").data == csv_before
+    assert client.get(f"/card/{card_ids[0]}/transactions?limit=100", headers=headers).json == history_before
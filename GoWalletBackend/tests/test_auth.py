@@ -0,0 +1,77 @@
+import pytest
+
+import app as gowallet
+from app import db, User
+
+def forget_verified_tokens():
+    """What another worker knows: nothing cached in this process."""
+    gowallet.principal_cache.clear()
+    gowallet.user_revocations.clear()
+
+@pytest.fixture
+def login(app, client):
+    """login(phone, password) adds a user with that password and returns the headers of a fresh login."""
+    def make(phone, password="old secret"):
+        with app.app_context():
+            user = User(name=f"User {phone}", phone=phone)
+            user.set_password(password)
+            db.session.add(user)
+            db.session.commit()
+        response = client.post("/login_user", json={"phone": phone, "password": password})
+        assert response.status_code == 200
+        return {"Authorization": "Bearer " + response.json["token"]}
+    return make
+
+def test_logout_reaches_other_workers(client, login):
+    headers = login("+998000000001")
+    assert client.get("/wallet", headers=headers).status_code == 200
+    assert client.post("/logout_user", headers=headers).status_code == 200
+    assert client.get("/wallet", headers=headers).status_code == 401
+    forget_verified_tokens()
+    assert client.get("/wallet", headers=headers).status_code == 401
+
+def test_password_change_revokes_other_sessions(client, login):
+    headers = login("+998000000002")
+    token = client.post("/login_user", json={"phone": "+998000000002", "password": "old secret"}).json["token"]
+    other_device = {"Authorization": "Bearer " + token}
+    assert client.get("/wallet", headers=other_device).status_code == 200
+
+    response = client.post("/change_password", headers=headers,
+                           json={"old_password": "wrong", "new_password": "new secret"})
+    assert response.status_code == 401
+    response = client.post("/change_password", headers=headers,
+                           json={"old_password": "old secret", "new_password": "new secret"})
+    assert response.status_code == 200
+    assert client.get("/wallet", headers=other_device).status_code == 401
+    assert client.get("/wallet", headers=headers).status_code == 401
+    forget_verified_tokens()
+    assert client.get("/wallet", headers=other_device).status_code == 401
+    assert client.get("/wallet", headers={"Authorization": "Bearer " + response.json["token"]}).status_code == 200
+    assert client.post("/login_user", json={"phone": "+998000000002", "password": "new secret"}).status_code == 200
+
+def test_lock_user(app, client, login):
+    headers = login("+998000000003")
+    runner = app.test_cli_runner()
+    assert runner.invoke(args=["lock-user", "+998000000003"]).exit_code == 0
+    forget_verified_tokens()
+    assert client.get("/wallet", headers=headers).status_code == 401
+    assert client.post("/login_user", json={"phone": "+998000000003", "password": "old secret"}).status_code == 403
+
+    assert runner.invoke(args=["lock-user", "+998000000003", "--unlock"]).exit_code == 0
+    assert client.post("/login_user", json={"phone": "+998000000003", "password": "old secret"}).status_code == 200
+    assert runner.invoke(args=["lock-user", "+998000000099"]).exit_code != 0
+
+def test_failed_revocation_is_not_cached(app, client, login, monkeypatch):
+    headers = login("+998000000004")
+    assert client.get("/wallet", headers=headers).status_code == 200
+    with app.app_context():
+        user_id = User.query.filter_by(phone="+998000000004").one().id
+        def commit():
+            raise RuntimeError("connection lost")
+        monkeypatch.setattr(db.session, "commit", commit)
+        with pytest.raises(RuntimeError):
+            gowallet.revoke_user(user_id)
+        monkeypatch.undo()
+        db.session.rollback()
+    assert gowallet.user_revocations.get(user_id) is None
+    assert client.get("/wallet", headers=headers).status_code == 200
@@ -0,0 +1,66 @@
+import pytest
+
+from app import db, Card, Transaction
+
+@pytest.fixture
+def cards(make_user, make_company):
+    """(card_id, card_id, auth headers) of a user with two cards of 100 each."""
+    _, (rich, poor), headers = make_user("+998000000001", cards=2, balance=100)
+    make_company("BATCH000000000000001")
+    return rich, poor, headers
+
+def item(card_id, amount, account_number="BATCH000000000000001"):
+    return {"card_id": card_id, "company_id": account_number, "amount": amount}
+
+def state(app, *card_ids):
+    with app.app_context():
+        return [float(db.session.get(Card, card_id).balance) for card_id in card_ids], db.session.query(Transaction).count()
+
+def test_partial_batch(app, client, cards):
+    rich, poor, headers = cards
+    client.post("/make_payment", headers=headers, json=item(poor, "50"))  # 50 left on poor
+    payments = [item(rich, "30"), item(poor, "40"), item(rich, "80"), item(poor, "10"),
+                item(rich, "1", account_number="NOSUCHCOMPANY"), item(rich, "70"), item(rich, "0.001")]
+    response = client.post("/make_payments/batch", headers=headers, json={"atomic": False, "payments": payments})
+    assert response.status_code == 200
+    assert response.json["status"] == "partial" and response.json["succeeded"] == 4
+    results = response.json["results"]
+    assert [result["status"] for result in results] == ["success", "success", "error", "success", "error", "success", "error"]
+    # Each payment reports the balance right after it, in request order
+    assert [results[i]["new_balance"] for i in (0, 1, 3, 5)] == [70, 10, 0, 0]
+    assert results[2]["error"] == "Insufficient funds on card" and results[2]["available_balance"] == 70
+    assert results[4]["error"] == "Company with the specified account number not found"
+    assert len({results[i]["transaction_id"] for i in (0, 1, 3, 5)}) == 4
+    assert state(app, rich, poor) == ([0, 0], 5)
+
+def test_atomic_batch_is_all_or_nothing(app, client, cards):
+    rich, poor, headers = cards
+    payments = [item(rich, "30"), item(poor, "40"), item(rich, "80")]
+    response = client.post("/make_payments/batch", headers=headers, json={"payments": payments})
+    assert response.status_code == 400
+    assert response.json["status"] == "failed" and response.json["atomic"] is True
+    assert [result["status"] for result in response.json["results"]] == ["skipped", "skipped", "error"]
+    assert state(app, rich, poor) == ([100, 100], 0)
+
+    response = client.post("/make_payments/batch", headers=headers, json={"payments": payments[:2]})
+    assert response.status_code == 200 and response.json["status"] == "success"
+    assert state(app, rich, poor) == ([70, 60], 2)
+
+def test_batch_only_debits_own_cards(app, client, cards, make_user):
+    rich, _, headers = cards
+    _, (other_card,), _ = make_user("+998000000002")
+    response = client.post("/make_payments/batch", headers=headers,
+                           json={"atomic": False, "payments": [item(rich, "1"), item(other_card, "1")]})
+    assert [result["status"] for result in response.json["results"]] == ["success", "error"]
+    assert response.json["results"][1]["error"] == "Card not found"
+    assert state(app, rich, other_card) == ([99, 1000], 1)
+
+def test_one_update_debits_every_card(app, client, cards, count_statements):
+    rich, poor, headers = cards
+    payments = [item(card_id, "1") for _ in range(50) for card_id in (rich, poor)]
+    with count_statements() as counter:
+        response = client.post("/make_payments/batch", headers=headers, json={"payments": payments})
+    assert response.json["succeeded"] == 100
+    card_updates = [statement for statement in counter.statements if statement.startswith("UPDATE card")]
+    assert len(card_updates) == 1 and "CASE" in card_updates[0]
+    assert state(app, rich, poor) == ([50, 50], 100)
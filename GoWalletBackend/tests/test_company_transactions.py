@@ -0,0 +1,26 @@
+from app import archived_months, encode_cursor
+
+MAX_STATEMENTS = 3  # company lookup + aggregate totals + page rows
+
+def test_page_statement_budget(app, client, make_user, make_company, seed_history, count_statements):
+    """Every page costs the same few statements however many cards and users it shows (no N+1)."""
+    company_id = make_company("TX0000000000000001")
+    card_ids = [make_user(f"+9980000000{i:02d}")[1][0] for i in range(30)]
+    positions = seed_history(company_id, card_ids, transactions=10)
+    assert app.test_cli_runner().invoke(args=["rebuild-daily-totals"]).exit_code == 0
+
+    with app.app_context():
+        archived_months()  # cached for every page after the first that reaches the end of the history
+    for cursor in [None] + [encode_cursor(*position) for position in positions[::50]]:
+        url = f"/company/{company_id}/transactions" + (f"?after={cursor}" if cursor else "")
+        with count_statements() as counter:
+            response = client.get(url)
+        assert response.status_code == 200
+        assert counter.count <= MAX_STATEMENTS, f"{url} issued {counter.count} statements"
+
+def test_page_shows_cardholders(client, make_user, make_company, seed_history):
+    company_id = make_company("TX0000000000000002")
+    _, card_ids, _ = make_user("+998000000100")
+    seed_history(company_id, card_ids, transactions=5)
+    page = client.get(f"/company/{company_id}/transactions").data.decode()
+    assert "User +998000000100" in page
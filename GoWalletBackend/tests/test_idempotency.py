@@ -0,0 +1,80 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app as gowallet
+from app import db, Card, Transaction
+
+@pytest.fixture
+def payment(make_user, make_company):
+    """(card_id, auth headers, a /make_payment body) for a user with one card of 1000."""
+    _, (card_id,), headers = make_user("+998000000001")
+    make_company("IDEM0000000000000001")
+    return card_id, headers, {"card_id": card_id, "company_id": "IDEM0000000000000001", "amount": "10"}
+
+def balance_and_transactions(app, card_id):
+    with app.app_context():
+        return float(db.session.get(Card, card_id).balance), db.session.query(Transaction).count()
+
+def test_replay_returns_the_stored_response(app, client, payment):
+    card_id, headers, body = payment
+    headers = {**headers, "Idempotency-Key": "order-1"}
+    first = client.post("/make_payment", headers=headers, json=body)
+    assert first.status_code == 200
+    assert "Idempotent-Replayed" not in first.headers
+
+    replayed = client.post("/make_payment", headers=headers, json=body)
+    assert replayed.status_code == 200
+    assert replayed.headers["Idempotent-Replayed"] == "true"
+    assert replayed.json == first.json
+    gowallet.idempotency_cache.clear()  # as on another worker
+    assert client.post("/make_payment", headers=headers, json=body).json == first.json
+    assert balance_and_transactions(app, card_id) == (990, 1)
+
+    # A new key is a new payment
+    second = client.post("/make_payment", headers={**headers, "Idempotency-Key": "order-2"}, json=body)
+    assert second.json["transaction_id"] != first.json["transaction_id"]
+    assert balance_and_transactions(app, card_id) == (980, 2)
+
+def test_key_reused_for_another_request(app, client, payment):
+    card_id, headers, body = payment
+    headers = {**headers, "Idempotency-Key": "order-1"}
+    assert client.post("/make_payment", headers=headers, json=body).status_code == 200
+    assert client.post("/make_payment", headers=headers, json={**body, "amount": "20"}).status_code == 422
+    gowallet.idempotency_cache.clear()
+    assert client.post("/make_payment", headers=headers, json={**body, "amount": "20"}).status_code == 422
+    assert balance_and_transactions(app, card_id) == (990, 1)
+
+def test_keys_are_per_user(app, client, payment, make_user):
+    card_id, headers, body = payment
+    _, (other_card,), other_headers = make_user("+998000000002")
+    assert client.post("/make_payment", headers={**headers, "Idempotency-Key": "k"}, json=body).status_code == 200
+    response = client.post("/make_payment", headers={**other_headers, "Idempotency-Key": "k"},
+                           json={**body, "card_id": other_card})
+    assert response.status_code == 200 and "Idempotent-Replayed" not in response.headers
+    assert balance_and_transactions(app, other_card)[0] == 990
+
+def test_duplicate_in_flight_waits_for_the_first(app, payment, monkeypatch):
+    card_id, headers, body = payment
+    headers = {**headers, "Idempotency-Key": "order-1"}
+    started, release = threading.Event(), threading.Event()
+    real_debit_card = gowallet.debit_card
+    def slow_debit_card(*args, **kwargs):
+        started.set()
+        assert release.wait(5)
+        return real_debit_card(*args, **kwargs)
+    monkeypatch.setattr(gowallet, "debit_card", slow_debit_card)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        first = executor.submit(app.test_client().post, "/make_payment", headers=headers, json=body)
+        assert started.wait(5)
+        duplicate = executor.submit(app.test_client().post, "/make_payment", headers=headers, json=body)
+        with pytest.raises(TimeoutError):
+            duplicate.result(timeout=0.2)  # waits rather than paying again
+        release.set()
+        first, duplicate = first.result(timeout=5), duplicate.result(timeout=5)
+    assert first.status_code == duplicate.status_code == 200
+    assert duplicate.headers["Idempotent-Replayed"] == "true"
+    assert duplicate.json == first.json
+    assert balance_and_transactions(app, card_id) == (990, 1)
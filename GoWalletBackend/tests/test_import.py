@@ -0,0 +1,16 @@
+from app import db, Card, User
+
+def test_import_users_ignores_balances(app, tmp_path):
+    path = tmp_path / "users.csv"
+    path.write_text("name,phone,password,card_number,expiry_month,expiry_year,cardholder_name,balance\n"
+                    "Ann,+998000000001,secret,8600000000000001,01,29,ANN,1000000\n"
+                    "Ann,+998000000001,secret,8600000000000002,02,29,ANN,\n"
+                    "Bob,+998000000002,secret,,,,,5\n")
+    result = app.test_cli_runner().invoke(args=["import-users", str(path), "--workers", "1"])
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        assert db.session.query(User).count() == 2
+        assert [card.balance for card in Card.query.all()] == [0, 0]
+
+def test_no_http_import(client):
+    assert client.post("/users/import", data="name,phone,password\n", content_type="text/csv").status_code == 404
@@ -0,0 +1,40 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from logos import LOGO_FOLDER, store_logo
+
+@pytest.fixture
+def uploads(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # LOGO_FOLDER is relative to the working directory
+    return tmp_path / LOGO_FOLDER
+
+def png(size=(300, 200)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 10, 10)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+def test_serves_processed_logos(client, uploads):
+    logo = store_logo(png())
+    response = client.get('/' + logo)
+    assert response.status_code == 200
+    assert Image.open(io.BytesIO(response.data)).size == (300, 200)
+    assert response.cache_control.immutable and response.cache_control.public
+
+    thumbnail = client.get('/' + logo.replace('.', '_64.'))
+    assert thumbnail.status_code == 200
+    assert Image.open(io.BytesIO(thumbnail.data)).size == (64, 43)
+
+def test_never_serves_uploads(client, uploads):
+    data = png()
+    digest = os.path.basename(store_logo(data)).split('.')[0]
+    (uploads / f"{digest}.upload").write_bytes(data)  # as if still waiting to be processed
+    (uploads / "old.png").write_bytes(data)  # from before logos were processed
+    for name in (f"{digest}.upload", "old.png", f"{digest}_99.jpg", "0" * 32 + ".png"):
+        assert client.get(f"/static/uploads/{name}").status_code == 404, name
+
+def test_failed_render(client, uploads):
+    logo = store_logo(png()[:100])  # the header reads fine, the pixels do not
+    assert client.get('/' + logo).status_code == 422
@@ -0,0 +1,66 @@
+import random
+
+import pytest
+
+from app import db, debit_cards_batch, Card, CompanyDailyTotal, Transaction
+from money import to_money, to_minor, from_minor, MINOR_UNITS, MAX_MINOR_UNITS
+
+def test_conversions_round_trip():
+    """to_money / to_minor / from_minor agree with plain integer arithmetic."""
+    rng = random.Random(0)
+    for _ in range(20000):
+        minor = rng.randrange(0, 10 ** 15)
+        amount = from_minor(minor)
+        for value in (amount, str(amount), float(amount)):
+            assert to_minor(value) == minor, value
+            assert to_money(value) == amount, value
+        if minor % MINOR_UNITS == 0:
+            assert to_minor(minor // MINOR_UNITS) == minor
+
+@pytest.mark.parametrize("bad", ["0.001", "1.005", "nan", "inf", "-inf", "abc", "", 0.125, True, None])
+def test_rejects_invalid_amounts(bad):
+    with pytest.raises(ValueError):
+        to_money(bad)
+
+def test_bounds():
+    largest = from_minor(MAX_MINOR_UNITS)
+    assert to_minor(largest) == MAX_MINOR_UNITS
+    assert to_minor(-largest) == -MAX_MINOR_UNITS
+    for too_large in (largest + from_minor(1), -largest - from_minor(1), from_minor(2 ** 53 - 1), "1e30", 10 ** 40):
+        with pytest.raises(ValueError):
+            to_money(too_large)
+
+def test_largest_balance_is_returned_exactly(app, client, make_user):
+    _, (card_id,), headers = make_user("+998000000001", balance=from_minor(MAX_MINOR_UNITS))
+    with app.app_context():
+        assert db.session.get(Card, card_id).balance == from_minor(MAX_MINOR_UNITS)
+    response = client.get(f"/get_card/{card_id}", headers=headers)
+    assert '"balance":9999999999999.99' in response.get_data(as_text=True).replace(" ", "")
+    assert to_money(response.json["balance"]) == from_minor(MAX_MINOR_UNITS)
+
+def test_amounts_within_bounds_are_written_exactly(app):
+    rng = random.Random(2)
+    with app.app_context():
+        for minor in [MAX_MINOR_UNITS - i for i in range(1000)] + [rng.randrange(MAX_MINOR_UNITS) for _ in range(20000)]:
+            amount = from_minor(minor)
+            assert to_money(app.json.loads(app.json.dumps(amount))) == amount, amount
+
+def test_no_drift(app, make_user, make_company):
+    """Card balance, transaction sum and daily rollup stay exact to the tiyin against an integer oracle."""
+    rng = random.Random(1)
+    amounts_minor = [rng.randrange(1, 100000) for _ in range(5000)]
+    spent_minor = sum(amounts_minor)
+    initial = from_minor(spent_minor + rng.randrange(0, 10 ** 6))
+    user_id, (card_id,), _ = make_user("+998000000002", balance=initial)
+    company_id = make_company("MONEY0000000000000001")
+
+    with app.app_context():
+        for offset in range(0, len(amounts_minor), 500):
+            payments = [{'card_id': card_id, 'company_id': company_id, 'amount': from_minor(minor)}
+                        for minor in amounts_minor[offset:offset + 500]]
+            assert all(isinstance(result, tuple) for result in debit_cards_batch(payments, user_id))
+
+        assert db.session.get(Card, card_id).balance == initial - from_minor(spent_minor)
+        transaction_sum = db.session.query(db.func.sum(Transaction.amount)).scalar()
+        assert transaction_sum == from_minor(spent_minor)
+        assert db.session.query(db.func.sum(CompanyDailyTotal.total_amount)).scalar() == transaction_sum
@@ -0,0 +1,105 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+
+import app as gowallet
+from app import db, debit_cards_batch, dispatch_payment_events, PaymentEvent
+from outbox import WebhookError, WEBHOOK_BATCH_SIZE, new_webhook_secret
+
+class Merchants:
+    """Stands in for post_events: records every POST and refuses those to the URLs in `failing`."""
+    def __init__(self):
+        self.posts = []  # (url, event ids)
+        self.failing = set()
+
+    def __call__(self, url, secret, body):
+        self.posts.append((url, [event['id'] for event in json.loads(body)['events']]))
+        if url in self.failing:
+            raise WebhookError("HTTP 503")
+
+@pytest.fixture
+def merchants(monkeypatch):
+    merchants = Merchants()
+    monkeypatch.setattr(gowallet, "post_events", merchants)
+    return merchants
+
+@pytest.fixture
+def pay(app, make_user):
+    """pay({company_id: payments}) makes the payments and returns {company_id: [event ids]}."""
+    user_id, (card_id,), _ = make_user("+998000000001", balance=10 ** 6)
+    def pay(payments):
+        with app.app_context():
+            debit_cards_batch([{'card_id': card_id, 'company_id': company_id, 'amount': 1}
+                               for company_id, count in payments.items() for _ in range(count)], user_id)
+            events = {}
+            for event in PaymentEvent.query.order_by(PaymentEvent.id):
+                events.setdefault(event.company_id, []).append(event.id)
+            return events
+    return pay
+
+def subscribed(make_company, account_number):
+    return make_company(account_number, webhook_url=f"https://merchant.example/{account_number}",
+                        webhook_secret=new_webhook_secret())
+
+def dispatch(app):
+    with app.app_context(), ThreadPoolExecutor(max_workers=4) as executor:
+        return dispatch_payment_events(executor)
+
+def event_state(app):
+    with app.app_context():
+        return {event.id: event for event in PaymentEvent.query}
+
+def test_one_post_per_merchant_batch(app, make_company, merchants, pay):
+    big, small = subscribed(make_company, "HOOK0000000000000001"), subscribed(make_company, "HOOK0000000000000002")
+    silent = make_company("HOOK0000000000000003")  # no webhook URL
+    events = pay({big: WEBHOOK_BATCH_SIZE * 2 + 50, small: 30, silent: 5})
+
+    assert dispatch(app) == len(events[big]) + len(events[small])
+    posts = {}
+    for url, event_ids in merchants.posts:
+        posts.setdefault(url, []).append(event_ids)
+    batch_sizes = sorted(len(batch) for batch in posts["https://merchant.example/HOOK0000000000000001"])
+    assert batch_sizes == [50, WEBHOOK_BATCH_SIZE, WEBHOOK_BATCH_SIZE]
+    assert posts["https://merchant.example/HOOK0000000000000002"] == [events[small]]
+    assert sorted(sum(posts["https://merchant.example/HOOK0000000000000001"], [])) == events[big]
+    assert len(posts) == 2
+
+    assert all(event.delivered_at is not None and event.next_attempt_at is None
+               for event in event_state(app).values())
+    assert dispatch(app) == 0
+    assert len(merchants.posts) == 4
+
+def test_delivered_only_after_success(app, make_company, merchants, pay):
+    down, up = subscribed(make_company, "HOOK0000000000000001"), subscribed(make_company, "HOOK0000000000000002")
+    merchants.failing.add("https://merchant.example/HOOK0000000000000001")
+    events = pay({down: 3, up: 2})
+
+    dispatch(app)
+    state = event_state(app)
+    for event_id in events[down]:
+        assert state[event_id].delivered_at is None
+        assert state[event_id].attempts == 1
+        assert state[event_id].last_error == "HTTP 503"
+        assert state[event_id].next_attempt_at > datetime.utcnow()
+    assert all(state[event_id].delivered_at is not None for event_id in events[up])
+
+    # Not due yet: nothing is posted again
+    posts = len(merchants.posts)
+    assert dispatch(app) == 0
+    assert len(merchants.posts) == posts
+
+    # Once due, the merchant accepts the retry
+    merchants.failing.clear()
+    with app.app_context():
+        PaymentEvent.query.filter(PaymentEvent.delivered_at.is_(None)) \
+            .update({'next_attempt_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+    assert dispatch(app) == 3
+    assert merchants.posts[-1] == ("https://merchant.example/HOOK0000000000000001", events[down])
+    state = event_state(app)
+    for event_id in events[down]:
+        assert state[event_id].delivered_at is not None
+        assert state[event_id].attempts == 2
+        assert state[event_id].last_error is None
@@ -0,0 +1,36 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+import app as gowallet
+from app import db, User
+from passwords import PasswordHasher
+
+@pytest.mark.parametrize("method", ["scrypt", "pbkdf2:sha256", "pbkdf2:sha256:1000", "scrypt:16384:8:1"])
+def test_short_method_names_match_their_hashes(method):
+    hasher = PasswordHasher(method, workers=0)
+    other = "scrypt" if method.startswith("pbkdf2") else "pbkdf2:sha256:1000"
+    assert not hasher.needs_rehash(hasher.hash("secret"))
+    assert hasher.needs_rehash(generate_password_hash("secret", other))
+
+@pytest.fixture
+def short_method(app):
+    gowallet.password_hasher.configure("pbkdf2:sha256", workers=0, queue=0)
+    yield
+    gowallet.password_hasher.init_app(app)
+
+def test_login_rehashes_once(app, client, short_method):
+    with app.app_context():
+        user = User(name="User", phone="+998000000001", password_hash=generate_password_hash("secret", "scrypt"))
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    def stored_hash():
+        with app.app_context():
+            return db.session.get(User, user_id).password_hash
+
+    login = {"phone": "+998000000001", "password": "secret"}
+    assert client.post("/login_user", json=login).status_code == 200
+    upgraded = stored_hash()
+    assert upgraded.startswith("pbkdf2:sha256:")
+    assert client.post("/login_user", json=login).status_code == 200
+    assert stored_hash() == upgraded
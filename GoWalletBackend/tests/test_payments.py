@@ -0,0 +1,82 @@
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+import app as gowallet
+from app import db, debit_card, Card, PaymentError, Transaction
+
+def balance_and_transactions(app, card_id):
+    with app.app_context():
+        return db.session.get(Card, card_id).balance, db.session.query(Transaction).filter_by(card_id=card_id).count()
+
+def test_overdraft_is_refused(app, client, make_user, make_company):
+    _, (card_id,), headers = make_user("+998000000001", balance=100)
+    make_company("PAY00000000000000001")
+    payment = {"card_id": card_id, "company_id": "PAY00000000000000001", "amount": "100.01"}
+    response = client.post("/make_payment", headers=headers, json=payment)
+    assert response.status_code == 400
+    assert response.json["available_balance"] == 100
+    assert balance_and_transactions(app, card_id) == (Decimal("100.00"), 0)
+
+    payment["amount"] = "100"
+    assert client.post("/make_payment", headers=headers, json=payment).json["new_balance"] == 0
+    assert client.post("/make_payment", headers=headers, json={**payment, "amount": "0.01"}).status_code == 400
+    assert balance_and_transactions(app, card_id) == (Decimal("0.00"), 1)
+
+def test_only_the_owner_can_debit(app, make_user, make_company):
+    user_id, _, _ = make_user("+998000000001")
+    _, (other_card,), _ = make_user("+998000000002")
+    company_id = make_company("PAY00000000000000001")
+    with app.app_context(), pytest.raises(PaymentError) as error:
+        debit_card(other_card, company_id, Decimal("1.00"), user_id)
+    assert error.value.status_code == 404
+    assert balance_and_transactions(app, other_card) == (Decimal("1000.00"), 0)
+
+def test_concurrent_payments_never_overdraw(app, make_user, make_company):
+    user_id, (card_id,), _ = make_user("+998000000001", balance=50)
+    company_id = make_company("PAY00000000000000001")
+    def pay(_):
+        with app.app_context():
+            try:
+                return debit_card(card_id, company_id, Decimal("7.00"), user_id)[1]
+            except PaymentError:
+                return None
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        new_balances = [balance for balance in executor.map(pay, range(20)) if balance is not None]
+    assert sorted(new_balances) == [Decimal(balance) for balance in (1, 8, 15, 22, 29, 36, 43)]
+    assert balance_and_transactions(app, card_id) == (Decimal("1.00"), 7)
+
+@pytest.fixture
+def locked_once(monkeypatch):
+    """Makes the first debit statement fail as if the database were locked by another writer."""
+    calls = []
+    real_debit_statement = gowallet.debit_statement
+    def debit_statement(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise OperationalError("UPDATE card", {}, Exception("database is locked"))
+        return real_debit_statement(*args)
+    monkeypatch.setattr(gowallet, "debit_statement", debit_statement)
+    monkeypatch.setattr(gowallet, "retry_backoff", lambda attempt: None)
+    return calls
+
+def test_conflict_is_retried(app, make_user, make_company, locked_once):
+    user_id, (card_id,), _ = make_user("+998000000001", balance=100)
+    company_id = make_company("PAY00000000000000001")
+    with app.app_context():
+        transaction, new_balance = debit_card(card_id, company_id, Decimal("30.00"), user_id)
+    assert len(locked_once) == 2
+    assert new_balance == Decimal("70.00")
+    assert balance_and_transactions(app, card_id) == (Decimal("70.00"), 1)
+
+def test_other_errors_are_not_retried(app, make_user, make_company, monkeypatch):
+    user_id, (card_id,), _ = make_user("+998000000001", balance=100)
+    company_id = make_company("PAY00000000000000001")
+    def debit_statement(*args):
+        raise OperationalError("UPDATE card", {}, Exception("disk I/O error"))
+    monkeypatch.setattr(gowallet, "debit_statement", debit_statement)
+    with app.app_context(), pytest.raises(OperationalError):
+        debit_card(card_id, company_id, Decimal("30.00"), user_id)
+    assert balance_and_transactions(app, card_id) == (Decimal("100.00"), 0)
@@ -0,0 +1,89 @@
+import fakeredis
+import pytest
+import redis
+
+from ratelimit import MemoryBackend, RedisBackend, RateLimiter, RateLimited, Limit, Velocity
+
+LIMIT = Limit('test-limit', rate=1, burst=3)
+RULES = (Velocity('test-count', window=60, max_count=3, max_amount=None),
+         Velocity('test-amount', window=3600, max_count=100, max_amount=1000))
+
+@pytest.fixture
+def redis_server(monkeypatch):
+    """A Redis stand-in with Lua scripting; every RedisBackend made from a URL connects to it."""
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, "from_url", lambda url, **kwargs: fakeredis.FakeRedis(server=server))
+    return server
+
+@pytest.fixture(params=["memory", "redis"])
+def limiter(request):
+    if request.param == "memory":
+        return RateLimiter(MemoryBackend())
+    request.getfixturevalue("redis_server")
+    return RateLimiter(RedisBackend("redis://localhost:6379/0"))
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+def test_token_bucket(limiter):
+    limiter.clock = clock = Clock()
+    for _ in range(LIMIT.burst):
+        limiter.hit((LIMIT, "key"))
+    with pytest.raises(RateLimited) as error:
+        limiter.hit((LIMIT, "key"))
+    assert error.value.retry_after == pytest.approx(1)
+    limiter.hit((LIMIT, "other key"))
+
+    clock.now += 1
+    limiter.hit((LIMIT, "key"))
+    with pytest.raises(RateLimited):
+        limiter.hit((LIMIT, "key"))
+
+def test_velocity_rules(limiter):
+    limiter.clock = clock = Clock()
+    reservation = limiter.record(RULES, "card", 900)
+    with pytest.raises(RateLimited) as error:
+        limiter.record(RULES, "card", 200)
+    assert error.value.name == 'test-amount'
+    assert error.value.retry_after == pytest.approx(3600)
+
+    # A declined payment gives its share back
+    limiter.release(reservation)
+    limiter.record(RULES, "card", 200)
+    limiter.record(RULES, "card", 1)
+    limiter.record(RULES, "card", 1)
+    with pytest.raises(RateLimited) as error:
+        limiter.record(RULES, "card", 1)
+    assert error.value.name == 'test-count'
+
+    # A rejected payment records under none of the rules
+    clock.now += 61
+    limiter.record(RULES, "card", 1)
+    limiter.record(RULES, "card", 1)
+    with pytest.raises(RateLimited) as error:
+        limiter.record(RULES, "card", 1000)
+    assert error.value.name == 'test-amount'
+    limiter.record(RULES, "card", 1)
+
+def test_redis_budget_is_shared_by_workers(redis_server):
+    workers = [RateLimiter(RedisBackend("redis://localhost:6379/0")) for _ in range(3)]
+    for worker in workers:
+        worker.hit((LIMIT, "key"))
+    for worker in workers:
+        with pytest.raises(RateLimited):
+            worker.hit((LIMIT, "key"))
+    workers[0].backend.clear()
+    workers[1].hit((LIMIT, "key"))
+
+def test_storage_setting(app, redis_server):
+    limiter = RateLimiter()
+    app.config['RATE_LIMIT_STORAGE'] = "redis://localhost:6379/0"
+    limiter.init_app(app)
+    assert isinstance(limiter.backend, RedisBackend)
+    app.config['RATE_LIMIT_STORAGE'] = "memory"
+    limiter.init_app(app)
+    assert isinstance(limiter.backend, MemoryBackend)
@@ -0,0 +1,74 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as gowallet
+from app import read_after, READ_AFTER_COOKIE, READ_AFTER_HEADER
+from replicas import ReplicaRouter
+
+@pytest.fixture
+def router(app):
+    """A router whose replica has caught up to `router.beat`, measured every 10 ms."""
+    def heartbeat():
+        if router.beat is None:
+            raise LookupError("replica unreachable")
+        return router.beat
+    router = ReplicaRouter(heartbeat, max_lag=5, interval=0.01)
+    router.beat = datetime.utcnow()
+    router.init_app(app)
+    router.enabled = True
+    yield router
+    router.interval = 3600  # the monitor thread cannot be stopped, park it
+
+def measured(router):
+    beat = router.beat
+    deadline = time.monotonic() + 5
+    while router.replayed_at != beat and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+def test_reads_wait_for_the_clients_write(router):
+    router.use_replica()  # starts the monitor
+    measured(router)
+    written_at = datetime.utcnow()
+    assert router.use_replica()
+    assert router.use_replica(written_at - timedelta(seconds=1))
+    assert not router.use_replica(written_at)
+
+    router.beat = datetime.utcnow()  # a heartbeat written after the write reached the replica
+    measured(router)
+    assert router.use_replica(written_at)
+
+    router.beat = datetime.utcnow() - timedelta(seconds=10)
+    measured(router)
+    assert not router.use_replica()
+    router.beat = None
+    time.sleep(0.1)
+    assert not router.use_replica() and router.replayed_at is None
+
+def test_writes_hand_out_a_marker(app, client, make_user, make_company, monkeypatch):
+    monkeypatch.setattr(gowallet.replica_router, "enabled", True)
+    _, (card_id,), headers = make_user("+998000000001")
+    make_company("REPL0000000000000001")
+    assert READ_AFTER_HEADER not in client.get(f"/get_card/{card_id}", headers=headers).headers
+
+    before = datetime.utcnow()
+    response = client.post("/make_payment", headers=headers,
+                           json={"card_id": card_id, "company_id": "REPL0000000000000001", "amount": "1"})
+    marker = response.headers[READ_AFTER_HEADER]
+    assert f"{READ_AFTER_COOKIE}={marker}" in response.headers["Set-Cookie"]
+
+    with app.test_request_context(headers={READ_AFTER_HEADER: marker}):
+        assert before <= read_after() <= datetime.utcnow()
+    with app.test_request_context(headers={"Cookie": f"{READ_AFTER_COOKIE}={marker}"}):
+        assert before <= read_after() <= datetime.utcnow()
+    for forged in (marker[:-2] + "xx", "1e30", ""):
+        with app.test_request_context(headers={READ_AFTER_HEADER: forged}):
+            assert read_after() is None
+
+def test_no_marker_without_a_replica(client, make_user):
+    _, _, headers = make_user("+998000000001")
+    response = client.post("/add_card", headers=headers, json={
+        "card_number": "4000000000000002", "expiry_month": "01", "expiry_year": "29", "cardholder_name": "ANN"})
+    assert response.status_code in (200, 201)
+    assert READ_AFTER_HEADER not in response.headers
@@ -0,0 +1,67 @@
+from app import db, verify_token, Transaction
+
+MAX_STATEMENTS = 2  # cards + recent transactions of all cards
+
+def test_wallet_statement_budget(app, client, make_user, make_company, seed_history, count_statements):
+    _, card_ids, headers = make_user("+998000000001", cards=11)
+    seed_history(make_company("WALLET000000000000001"), card_ids[:-1], transactions=50)  # the last card has none
+    with app.app_context():
+        verify_token(headers["Authorization"][len("Bearer "):])  # a token is checked against the database once
+
+    with count_statements() as cold:
+        response = client.get("/wallet", headers=headers)
+    assert response.status_code == 200
+    assert cold.count <= MAX_STATEMENTS
+    with count_statements() as cached:
+        assert client.get("/wallet", headers=headers).json == response.json
+    assert cached.count == 0
+
+    cards = response.json["cards"]
+    assert [card["id"] for card in cards] == card_ids
+    assert cards == [client.get(f"/get_card/{card_id}", headers=headers).json for card_id in card_ids]
+
+def test_wallet_shows_payments_and_deletions(app, client, make_user, make_company):
+    _, card_ids, headers = make_user("+998000000001", cards=2)
+    account_number = "WALLET000000000000002"
+    make_company(account_number)
+    client.get("/wallet", headers=headers)
+
+    paid = client.post("/make_payment", headers=headers,
+                       json={"card_id": card_ids[0], "company_id": account_number, "amount": "12.34"})
+    assert paid.status_code == 200
+    first = client.get("/wallet", headers=headers).json["cards"][0]
+    assert first["balance"] == paid.json["new_balance"]
+    assert first["recent_transactions"][0]["id"] == paid.json["transaction_id"]
+
+    client.delete(f"/delete_card/{card_ids[1]}", headers=headers)
+    assert [card["id"] for card in client.get("/wallet", headers=headers).json["cards"]] == card_ids[:1]
+
+def test_card_history_pages(app, client, make_user, make_company, seed_history):
+    """Following next_cursor visits every transaction once, newest first, even while new ones arrive."""
+    _, (card_id, other_card), headers = make_user("+998000000001", cards=2)
+    account_number = "WALLET000000000000003"
+    seed_history(make_company(account_number), [card_id, other_card], transactions=250, ties=3)
+    with app.app_context():
+        expected = [id for id, in db.session.query(Transaction.id).filter_by(card_id=card_id)
+                    .order_by(Transaction.timestamp.desc(), Transaction.id.desc())]
+
+    seen, cursor = [], ""
+    for page in range(100):
+        response = client.get(f"/card/{card_id}/transactions?cursor={cursor}&limit=40", headers=headers)
+        assert response.status_code == 200
+        seen += [item["id"] for item in response.json["transactions"]]
+        cursor = response.json["next_cursor"]
+        if cursor is None:
+            break
+        if page == 1:
+            # A payment made meanwhile belongs before the first page, not in the rest
+            assert client.post("/make_payment", headers=headers,
+                               json={"card_id": card_id, "company_id": account_number, "amount": "1"}).status_code == 200
+    assert len(seen) == len(set(seen))
+    assert seen == expected
+
+def test_card_history_rejects_bad_requests(client, make_user):
+    _, (card_id,), headers = make_user("+998000000001")
+    _, (other_card,), _ = make_user("+998000000002")
+    assert client.get(f"/card/{card_id}/transactions?cursor=garbage", headers=headers).status_code == 400
+    assert client.get(f"/card/{other_card}/transactions", headers=headers).status_code == 404
@@ -0,0 +1,9 @@
+"""
+Production entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+    uvicorn --interface wsgi --workers 4 wsgi:app
+"""
+from app import create_app
+
+app = create_app()